@@ -1,8 +1,36 @@
 import argparse
+import atexit
 import serial
+import struct
 import time
 import sys
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# START + CMD + LIGHT + FUNC + VALUE_LOW + VALUE_HIGH + CHECKSUM + END
+_FRAME = struct.Struct('<BBBBBBBB')
+
+# OK/NOT OK replies may come as a minimal 4-byte frame ending in the end
+# marker (START + TYPE + LIGHT + END); everything else is a full frame
+_MINIMAL_SIZE = 4
+_MINIMAL_TYPES = (ord('O'), ord('N'))
+
+# Batches at least this large are built with NumPy (when installed); below
+# it the per-call NumPy overhead outweighs the vectorized checksum
+_NUMPY_BATCH_MIN = 16
+
+# Open serial connections, reused across send_command calls
+_PORTS = {}
+
+def format_hex(data):
+    # Render bytes as "0xAA 0x53 ..." in a single C-level hex pass
+    if not data:
+        return ""
+    return "0x" + bytes(data).hex(' ').upper().replace(' ', ' 0x')
+
 def generate_message(cmd, light, func, value):
     encoded_value = round(value)
     
@@ -14,7 +42,7 @@ def generate_message(cmd, light, func, value):
 
     checksum = cmd ^ light ^ func ^ value_low ^ value_high
 
-    message = [
+    message = _FRAME.pack(
         0xAA,   # Start marker
         cmd,    # Command
         light,  # Light identifier
@@ -23,7 +51,7 @@ def generate_message(cmd, light, func, value):
         value_high,  # MSB
         checksum,    # Checksum
         0x55    # End marker
-    ]
+    )
     
     return {
         "value": value,
@@ -31,6 +59,57 @@ def generate_message(cmd, light, func, value):
         "message": message
     }
 
+def _pack_into(buf, offset, cmd, light, func, encoded_value):
+    # Write one 8-byte frame into buf at offset (all arguments are ints)
+    value_low = encoded_value & 0xFF
+    value_high = (encoded_value >> 8) & 0xFF
+    checksum = cmd ^ light ^ func ^ value_low ^ value_high
+    _FRAME.pack_into(buf, offset, 0xAA, cmd, light, func, value_low, value_high, checksum, 0x55)
+
+def _char_codes_numpy(col):
+    # Code points of a column of single characters as a uint8 array, or None
+    # if any entry is not a one-character string in the 0-255 range.
+    # A plain str column is taken character by character, as indexing it
+    # does on the list path.
+    arr = np.asarray(list(col) if isinstance(col, str) else col)
+    if arr.ndim != 1 or arr.dtype.kind != 'U' or (np.char.str_len(arr) != 1).any():
+        return None
+    # Viewing the characters as UCS-4 code points does ord() on the whole column
+    codes = arr.astype('U1').view(np.uint32)
+    if codes.max(initial=0) > 0xFF:
+        return None
+    return codes.astype(np.uint8)
+
+def _generate_batch_numpy(codes, values):
+    # Vectorized variant of generate_batch for validated character columns
+    values = np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64)
+    cols = np.stack(codes + [(values & 0xFF).astype(np.uint8),
+                             ((values >> 8) & 0xFF).astype(np.uint8)], axis=1)
+    out = np.empty((len(cols), 8), dtype=np.uint8)
+    out[:, 0] = 0xAA
+    out[:, 1:6] = cols
+    out[:, 6] = np.bitwise_xor.reduce(cols, axis=1)
+    out[:, 7] = 0x55
+    return out.tobytes()
+
+def generate_batch(cmds, lights, funcs, values):
+    # Build many messages into one contiguous bytes object (8 bytes per
+    # message), ready to be written to the port in a single call.
+    # cmds/lights/funcs are sequences of single characters as for
+    # generate_message; large batches are vectorized when NumPy is installed.
+    # Columns NumPy can't take as-is (e.g. multi-character entries) go
+    # through the per-message path, which raises the same errors as always.
+    count = len(cmds)
+    if np is not None and count >= _NUMPY_BATCH_MIN:
+        codes = [_char_codes_numpy(col) for col in (cmds, lights, funcs)]
+        if all(c is not None and len(c) == count for c in codes) and len(values) == count:
+            return _generate_batch_numpy(codes, values)
+
+    out = bytearray(8 * count)
+    for i in range(count):
+        _pack_into(out, i * 8, ord(cmds[i]), ord(lights[i]), ord(funcs[i]), round(values[i]))
+    return bytes(out)
+
 def parse_response(response_bytes):
     # Check if we have a valid response (minimum 4 bytes for minimal response)
     if len(response_bytes) < 4:
@@ -41,7 +120,7 @@ def parse_response(response_bytes):
         return {"status": "error", "message": "Invalid response markers"}
     
     # Print the full response for debugging
-    print(f"Debug - Full response: {' '.join(f'0x{x:02X}' for x in response_bytes)}")
+    print(f"Debug - Full response: {format_hex(response_bytes)}")
     
     # Based on the example response format from the output
     # It appears the format is: 0xAA 0x4F 0x00 0x50 0x0F 0x00 0x10 0x55
@@ -102,27 +181,58 @@ def parse_response(response_bytes):
             "unit": unit
         }
     
-    return {"status": "error", "message": f"Unknown response format: {' '.join(f'0x{x:02X}' for x in response_bytes)}"}
+    return {"status": "error", "message": f"Unknown response format: {format_hex(response_bytes)}"}
+
+def get_connection(port):
+    ser = _PORTS.get(port)
+    if ser is None or not ser.is_open:
+        ser = serial.Serial(port, 115200, timeout=0.2)
+        _PORTS[port] = ser
+        print(f"Connected to {port}")
+    return ser
+
+def close_connection(port):
+    ser = _PORTS.pop(port, None)
+    if ser is not None and ser.is_open:
+        ser.close()
+
+def close_all_connections():
+    for port in list(_PORTS):
+        close_connection(port)
+
+atexit.register(close_all_connections)
 
 def send_command(port, cmd, light, func, value):
     message_data = generate_message(cmd, light, func, value)
-    message_bytes = bytearray(message_data["message"])
+    message_bytes = message_data["message"]
     
     try:
-        ser = serial.Serial(port, 115200, timeout=1)
-        print(f"Connected to {port}")
+        ser = get_connection(port)
+        
+        # Drop anything left over from an earlier timed-out command, so a
+        # late reply can't be taken as this command's response
+        ser.reset_input_buffer()
         
         # Send the message
-        print(f"Sending: {' '.join(f'0x{x:02X}' for x in message_bytes)}")
+        print(f"Sending: {format_hex(message_bytes)}")
         ser.write(message_bytes)
         
-        # Wait for response
-        time.sleep(0.1)
-        
-        # Read response
-        if ser.in_waiting:
-            response = ser.read(ser.in_waiting)
-            print(f"Received: {' '.join(f'0x{x:02X}' for x in response)}")
+        # Read response; read the minimal frame first and the rest of a full
+        # frame only if the reply isn't complete yet, so short replies don't
+        # wait out the read timeout
+        response = ser.read(_MINIMAL_SIZE)
+        minimal = (len(response) == _MINIMAL_SIZE and
+                   response[1] in _MINIMAL_TYPES and response[3] == 0x55)
+        if len(response) == _MINIMAL_SIZE and not minimal:
+            response += ser.read(_FRAME.size - _MINIMAL_SIZE)
+        if 0 < len(response) < _FRAME.size and not minimal:
+            # Timed out mid-frame: drop the rest so the next command's
+            # response starts on a frame boundary
+            print(f"Incomplete response received: {format_hex(response)}")
+            ser.reset_input_buffer()
+            return False
+        if response:
+            print(f"Received: {format_hex(response)}")
             
             # Parse the response
             parsed = parse_response(response)
@@ -134,13 +244,16 @@ def send_command(port, cmd, light, func, value):
             else:
                 print(f"Error: {parsed['message']}")
         else:
+            # Transaction failed; the connection stays open for a retry
             print("No response received")
+            return False
             
-        ser.close()
         return True
         
     except serial.SerialException as e:
         print(f"Error: {e}")
+        # Port-level failure: drop the connection so the next attempt reopens it
+        close_connection(port)
         return False
 
 def main():
@@ -180,7 +293,7 @@ def main():
     
     print(f"Command: {args.cmd} (Light {args.light}, {args.func}, Value: {formatted_value})")
     print(f"Encoded value: {result['encoded_value']}")
-    print("Message bytes:", ' '.join(f"0x{x:02X}" for x in result['message']))
+    print("Message bytes:", format_hex(result['message']))
     print("---")
     
     # If a port is specified, try to connect and send the command
@@ -188,6 +301,8 @@ def main():
         max_retries = 3
         success = False
         
+        # Retries resend over the same open connection with a short
+        # exponential backoff; the port is only reopened after a SerialException
         for attempt in range(1, max_retries + 1):
             print(f"Attempt {attempt} of {max_retries}...")
             if send_command(args.port, args.cmd, args.light, args.func, args.value):
@@ -195,8 +310,9 @@ def main():
                 break
             
             if attempt < max_retries:
-                print(f"Retrying in 2 seconds...")
-                time.sleep(2)
+                delay = 0.01 * 2 ** attempt
+                print(f"Retrying in {delay * 1000:.0f} ms...")
+                time.sleep(delay)
         
         if not success:
             print(f"Failed to communicate after {max_retries} attempts")
@@ -6,14 +6,15 @@ This script checks if a specified serial port is available and functional.
 It can be used to diagnose issues with serial connections before running tests.
 
 Usage:
-    python check_serial_port.py [PORT_NAME]
+    python check_serial_port.py [PORT_NAME] [--skip-list]
     
 Example:
     python check_serial_port.py COM19
+    python check_serial_port.py COM19 --skip-list
 """
 
-import sys
 import time
+import argparse
 import platform
 import serial
 import serial.tools.list_ports
@@ -58,16 +59,18 @@ def check_port(port_name):
         
         # Try to read from the port
         print("\n Attempting to read data (5 second timeout)...")
-        start_time = time.time()
+        deadline = time.monotonic() + 5
         received_data = b""
-        
-        # Read for up to 5 seconds or until we get data
-        while (time.time() - start_time) < 5:
-            if ser.in_waiting > 0:
-                data = ser.read(ser.in_waiting)
+
+        # Read for up to 5 seconds; each read blocks in the driver for at
+        # most half a second, so data is reported as it arrives. The timeout
+        # is configured once since changing it reprograms the port.
+        ser.timeout = 0.5
+        while time.monotonic() < deadline:
+            data = ser.read(4096)
+            if data:
                 received_data += data
                 print(f"   Received: {data}")
-            time.sleep(0.1)
         
         if received_data:
             print(f" Received {len(received_data)} bytes in 5 seconds.")
@@ -106,16 +109,33 @@ def get_recommendations():
         print(" - Check that the device is properly connected and powered")
         print(" - Try a different USB port")
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Serial Port Check Utility for Wiseled_LBR HIL Testing')
+    parser.add_argument('port', nargs='?', help='Serial port to check (e.g., COM19 or /dev/ttyUSB0)')
+    parser.add_argument('--skip-list', action='store_true',
+                        help='Skip serial port enumeration and check the given port directly')
+    return parser.parse_args()
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     print("\nSerial Port Check Utility for Wiseled_LBR HIL Testing")
     print(f"Python {platform.python_version()} on {platform.system()}")
     
+    if args.port and args.skip_list:
+        # The user already knows the port - skip the (slow) port enumeration
+        check_port(args.port)
+        get_recommendations()
+        print("\nDone.")
+        return
+    
     available_ports = list_available_ports()
     
-    if len(sys.argv) > 1:
+    if args.port:
         # Port specified on command line
-        port_to_check = sys.argv[1]
+        port_to_check = args.port
         print(f"\nYou specified port: {port_to_check}")
         
         if port_to_check not in available_ports:
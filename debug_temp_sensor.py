@@ -1,7 +1,13 @@
 # debug_temp_sensor.py
+import os
+import sys
 import time
-from resources.ImprovedSerialHelper import ImprovedSerialHelper
-from resources.ImprovedHILProtocol import ImprovedHILProtocol
+
+# The helpers import their shared modules from resources/, so put it on the path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources'))
+
+from ImprovedSerialHelper import ImprovedSerialHelper
+from ImprovedHILProtocol import ImprovedHILProtocol
 
 helper = ImprovedSerialHelper()
 hil = ImprovedHILProtocol()
@@ -20,20 +26,25 @@ command = {
 }
 helper.send_illuminator_command(command)
 
-# Try different temperatures
+# Sensor read command, reused across the sweep; only the id changes
+sensor_command = {
+    "type": "cmd",
+    "id": "get-sensor",
+    "topic": "status",
+    "action": "get_sensors",
+    "data": {"id": 1}
+}
+
+# Try different temperatures over the same two open connections
 for temp in [10, 30, 50, 100, 150]:
     print(f"\nTesting temperature: {temp}°C")
     # Set temperature
     hil.set_temperature_simulation(1, temp)
-    time.sleep(1)
+    time.sleep(1)  # Let the simulated sensor settle
     
     # Get sensor reading
-    command = {
-        "type": "cmd",
-        "id": f"get-sensor-{temp}",
-        "topic": "status",
-        "action": "get_sensors",
-        "data": {"id": 1}
-    }
-    response = helper.send_illuminator_command(command)
-    print(f"Response: {response}")
\ No newline at end of file
+    sensor_command["id"] = f"get-sensor-{temp}"
+    response = helper.send_illuminator_command(sensor_command)
+    print(f"Response: {response}")
+
+helper.close_all_connections()
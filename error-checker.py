@@ -12,6 +12,12 @@ import json
 import argparse
 from serial import Serial
 
+# orjson is optional; it encodes straight to bytes and parses bytes directly
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Test Wiseled_LBR communication')
     parser.add_argument('port', help='Serial port (e.g., COM19 or /dev/ttyUSB0)')
@@ -19,39 +25,135 @@ def parse_args():
     parser.add_argument('--timeout', type=float, default=2.0, help='Read timeout in seconds (default: 2.0)')
     return parser.parse_args()
 
-def send_command(ser, command_dict):
-    """Send a command and get the response"""
-    # Convert to JSON string
-    command_str = json.dumps(command_dict)
-    print(f"Sending: {command_str}")
-    
-    # Add newline and send
-    command_str += "\n"
-    ser.write(command_str.encode('utf-8'))
-    
-    # Read response
-    response_str = ser.readline().decode('utf-8').strip()
+def encode_command(command_dict):
+    """Serialize a command to a newline-terminated UTF-8 line"""
+    if orjson is not None:
+        return orjson.dumps(command_dict) + b"\n"
+    return json.dumps(command_dict).encode('utf-8') + b"\n"
+
+def decode_response(response_line):
+    """Parse a raw response line (bytes) into a dictionary"""
+    if orjson is not None:
+        return orjson.loads(response_line)
+    return json.loads(response_line)
+
+def parse_response(response_line):
+    """Log and parse one response line read from the port"""
+    response_str = response_line.decode('utf-8', errors='replace').strip()
     print(f"Received: {response_str}")
     
-    # Parse JSON response
+    # Parse JSON response (both parsers raise json.JSONDecodeError subclasses)
     try:
-        return json.loads(response_str)
+        return decode_response(response_line)
     except json.JSONDecodeError:
         print(f"Error parsing JSON: {response_str}")
         return {"error": "Invalid JSON"}
 
-def check_ping(ser):
-    """Check if the device is responding to ping commands"""
-    print("\n=== Testing Basic Connectivity ===")
-    command = {
-        "type": "cmd",
-        "id": "diag-ping-001",
-        "topic": "system",
-        "action": "ping",
-        "data": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")}
-    }
+def send_line(ser, command_line):
+    """Send an already encoded command line and get the response"""
+    print(f"Sending: {command_line.decode('utf-8').strip()}")
+    ser.write(command_line)
+    
+    return parse_response(ser.readline())
+
+def send_commands(ser, command_lines):
+    """
+    Send several encoded command lines back-to-back and collect the responses by id
+    
+    The device answers in command order, so a reply without a known id
+    (an error frame or invalid JSON) is taken as the response to the oldest
+    command still waiting for one, and reported.
+    """
+    pending = []
+    for command_line in command_lines:
+        print(f"Sending: {command_line.decode('utf-8').strip()}")
+        pending.append(decode_response(command_line).get("id"))
+    
+    # Write all commands in one go, then read one response line per command
+    ser.write(b''.join(command_lines))
     
-    response = send_command(ser, command)
+    responses = {}
+    for _ in command_lines:
+        response_line = ser.readline()
+        if not response_line:
+            # Timed out - remaining responses are missing
+            break
+        
+        response = parse_response(response_line)
+        response_id = response.get("id")
+        if response_id in pending:
+            pending.remove(response_id)
+        elif pending:
+            response_id = pending.pop(0)
+            print(f"! Reply without a matching id, taken as the response to {response_id}")
+        else:
+            print("! Unexpected reply with no command waiting for it")
+            continue
+        responses[response_id] = response
+    
+    return responses
+
+# Diagnostic commands, serialized once. Commands whose content never changes
+# are stored fully encoded; the rest only fill their variable fields into a
+# pre-rendered JSON template.
+PING_ID = "diag-ping-001"
+PING_TEMPLATE = (
+    '{"type":"cmd","id":"' + PING_ID + '","topic":"system","action":"ping",'
+    '"data":{"timestamp":"%s"}}\n'
+)
+
+INFO_ID = "diag-info-001"
+INFO_COMMAND = encode_command({
+    "type": "cmd",
+    "id": INFO_ID,
+    "topic": "system",
+    "action": "info",
+    "data": {}
+})
+
+ALARM_STATUS_ID = "diag-alarm-001"
+ALARM_STATUS_COMMAND = encode_command({
+    "type": "cmd",
+    "id": ALARM_STATUS_ID,
+    "topic": "alarm",
+    "action": "status",
+    "data": {}
+})
+
+LIGHT_GET_ID = "diag-light-get-001"
+LIGHT_GET_COMMAND = encode_command({
+    "type": "cmd",
+    "id": LIGHT_GET_ID,
+    "topic": "light",
+    "action": "get_all",
+    "data": {}
+})
+
+LIGHT_SET_ID = "diag-light-set-%d-%d"
+LIGHT_SET_TEMPLATE = (
+    '{"type":"cmd","id":"' + LIGHT_SET_ID + '","topic":"light","action":"set",'
+    '"data":{"id":%d,"intensity":%d}}\n'
+)
+
+CLEAR_ALARMS_COMMAND = encode_command({
+    "type": "cmd",
+    "id": "diag-clear-all-001",
+    "topic": "alarm",
+    "action": "clear",
+    "data": {"lights": [1, 2, 3]}
+})
+
+def ping_command():
+    """Encode a ping command stamped with the current time"""
+    return (PING_TEMPLATE % time.strftime("%Y-%m-%dT%H:%M:%SZ")).encode('utf-8')
+
+def light_set_command(light_id, intensity):
+    """Encode a set command for one light"""
+    return (LIGHT_SET_TEMPLATE % (light_id, intensity, light_id, intensity)).encode('utf-8')
+
+def report_ping(response):
+    """Evaluate a ping response"""
+    print("\n=== Testing Basic Connectivity ===")
     if response.get("type") == "resp" and response.get("data", {}).get("status") == "ok":
         print("✓ Ping test successful")
         return True
@@ -59,18 +161,9 @@ def check_ping(ser):
         print("✗ Ping test failed")
         return False
 
-def check_system_info(ser):
-    """Check basic system information"""
+def report_system_info(response):
+    """Evaluate a system info response"""
     print("\n=== Getting System Information ===")
-    command = {
-        "type": "cmd",
-        "id": "diag-info-001",
-        "topic": "system",
-        "action": "info",
-        "data": {}
-    }
-    
-    response = send_command(ser, command)
     if response.get("type") == "resp" and response.get("data", {}).get("status") == "ok":
         print("✓ System info available")
         print(f"Device info: {json.dumps(response.get('data', {}), indent=2)}")
@@ -79,18 +172,9 @@ def check_system_info(ser):
         print("✗ System info not available")
         return False
 
-def check_alarm_status(ser):
-    """Check if there are any active alarms"""
+def report_alarm_status(response):
+    """Evaluate an alarm status response; False if any alarm is active"""
     print("\n=== Checking Alarm Status ===")
-    command = {
-        "type": "cmd",
-        "id": "diag-alarm-001",
-        "topic": "alarm",
-        "action": "status",
-        "data": {}
-    }
-    
-    response = send_command(ser, command)
     if response.get("type") == "resp" and response.get("data", {}).get("status") == "ok":
         active_alarms = response.get("data", {}).get("active_alarms", [])
         if active_alarms:
@@ -105,18 +189,9 @@ def check_alarm_status(ser):
         print("✗ Failed to check alarm status")
         return False
 
-def check_light_get(ser):
-    """Test if we can read the current light states"""
+def report_light_get(response):
+    """Evaluate a light status response"""
     print("\n=== Checking Light Status ===")
-    command = {
-        "type": "cmd",
-        "id": "diag-light-get-001",
-        "topic": "light",
-        "action": "get_all",
-        "data": {}
-    }
-    
-    response = send_command(ser, command)
     if response.get("type") == "resp" and response.get("data", {}).get("status") == "ok":
         intensities = response.get("data", {}).get("intensities", [])
         print(f"✓ Current light intensities: {intensities}")
@@ -125,48 +200,50 @@ def check_light_get(ser):
         print("✗ Failed to get light status")
         return False
 
+def check_alarm_status(ser):
+    """Check if there are any active alarms"""
+    return report_alarm_status(send_line(ser, ALARM_STATUS_COMMAND))
+
+def run_basic_checks(ser):
+    """Run the ping, info, alarm and light status checks in one pipelined round"""
+    responses = send_commands(ser, [ping_command(), INFO_COMMAND, ALARM_STATUS_COMMAND, LIGHT_GET_COMMAND])
+    
+    ping_ok = report_ping(responses.get(PING_ID, {}))
+    if not ping_ok:
+        return ping_ok, False, False, False
+    
+    system_ok = report_system_info(responses.get(INFO_ID, {}))
+    alarm_ok = report_alarm_status(responses.get(ALARM_STATUS_ID, {}))
+    get_ok = report_light_get(responses.get(LIGHT_GET_ID, {}))
+    return ping_ok, system_ok, alarm_ok, get_ok
+
 def attempt_light_set(ser):
     """Try to set each light individually and report results"""
     print("\n=== Testing Individual Light Control ===")
     success = True
     
-    for light_id in range(1, 4):
-        for intensity in [25, 50, 75]:
-            command = {
-                "type": "cmd",
-                "id": f"diag-light-set-{light_id}-{intensity}",
-                "topic": "light",
-                "action": "set",
-                "data": {"id": light_id, "intensity": intensity}
-            }
-            
-            response = send_command(ser, command)
-            status = response.get("data", {}).get("status")
-            
-            if status == "ok":
-                print(f"✓ Successfully set light {light_id} to {intensity}%")
-            else:
-                success = False
-                message = response.get("data", {}).get("message", "Unknown error")
-                print(f"✗ Failed to set light {light_id} to {intensity}%: {message}")
-                
-            # Small delay between commands
-            time.sleep(0.5)
+    settings = [(light_id, intensity) for light_id in range(1, 4) for intensity in [25, 50, 75]]
+    
+    # Pipeline all set commands and match the responses by id
+    responses = send_commands(ser, [light_set_command(*setting) for setting in settings])
+    
+    for light_id, intensity in settings:
+        response = responses.get(LIGHT_SET_ID % (light_id, intensity), {"error": "No response"})
+        status = response.get("data", {}).get("status")
+        
+        if status == "ok":
+            print(f"✓ Successfully set light {light_id} to {intensity}%")
+        else:
+            success = False
+            message = response.get("data", {}).get("message", "Unknown error")
+            print(f"✗ Failed to set light {light_id} to {intensity}%: {message}")
     
     return success
 
 def attempt_clear_alarms(ser):
     """Try to clear all possible alarms"""
     print("\n=== Attempting to Clear All Alarms ===")
-    command = {
-        "type": "cmd",
-        "id": "diag-clear-all-001",
-        "topic": "alarm",
-        "action": "clear",
-        "data": {"lights": [1, 2, 3]}
-    }
-    
-    response = send_command(ser, command)
+    response = send_line(ser, CLEAR_ALARMS_COMMAND)
     status = response.get("data", {}).get("status")
     
     if status == "ok":
@@ -194,15 +271,11 @@ def main():
         print(f"Connected successfully to {args.port}")
         
         # Run diagnostic tests
-        ping_ok = check_ping(ser)
+        ping_ok, system_ok, alarm_ok, get_ok = run_basic_checks(ser)
         if not ping_ok:
             print("\n! Basic connectivity issue detected. Check physical connections and power.")
             return
         
-        system_ok = check_system_info(ser)
-        alarm_ok = check_alarm_status(ser)
-        get_ok = check_light_get(ser)
-        
         if not alarm_ok:
             print("\n! Active alarms detected. Attempting to clear...")
             attempt_clear_alarms(ser)
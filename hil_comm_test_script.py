@@ -8,6 +8,7 @@ import serial
 import struct
 import time
 import argparse
+import functools
 
 class HILProtocol:
     # Protocol Constants
@@ -24,24 +25,29 @@ class HILProtocol:
     SIGNAL_CURRENT = ord('C')
     SIGNAL_TEMP = ord('T')
 
-    @staticmethod
-    def calculate_checksum(cmd, light, function, value):
-        """Calculate XOR checksum"""
-        checksum = cmd ^ light ^ function
-        checksum ^= (value & 0xFF)
-        checksum ^= ((value >> 8) & 0xFF)
-        return checksum
+    # Precompiled 8-byte frame layout
+    _FRAME = struct.Struct('<BBBBBBBB')
+
+    # Expected start of an OK response, and the 16-bit value field inside it
+    _OK_PREFIX = bytes((START_MARKER, ord('O')))
+    _VALUE = struct.Struct('<H')
 
     @staticmethod
+    @functools.lru_cache(maxsize=256)
     def create_message(cmd, light, function, value=0):
-        """Create HIL protocol message"""
-        checksum = HILProtocol.calculate_checksum(cmd, light, function, value)
-        return struct.pack('<BBBBHBB', 
+        """Create HIL protocol message (memoized, frames are immutable bytes)"""
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError(f"HIL value out of 16-bit range: {value}")
+        value_low = value & 0xFF
+        value_high = (value >> 8) & 0xFF
+        checksum = cmd ^ light ^ function ^ value_low ^ value_high
+        return HILProtocol._FRAME.pack(
             HILProtocol.START_MARKER,  # Start marker
             cmd,                       # Command
             light,                     # Light/Channel
             function,                  # Signal type
-            value,                     # Value
+            value_low,                 # Value (low byte)
+            value_high,                # Value (high byte)
             checksum,                  # Checksum
             HILProtocol.END_MARKER     # End marker
         )
@@ -90,18 +96,14 @@ class HILTester:
                 print("Incomplete response received")
                 return None
             
-            # Unpack response
-            unpacked = struct.unpack('<BBBBHBB', response)
-            
-            # Validate markers and response status
-            if (unpacked[0] != HILProtocol.START_MARKER or 
-                unpacked[1] != ord('O') or  # OK status
-                unpacked[6] != HILProtocol.END_MARKER):
+            # Validate markers and OK status with one prefix compare
+            if (not response.startswith(HILProtocol._OK_PREFIX) or
+                response[7] != HILProtocol.END_MARKER):
                 print("Invalid response")
                 return None
             
-            # Extract firmware version
-            firmware_version = unpacked[4]
+            # Extract firmware version (value field, little endian)
+            firmware_version = HILProtocol._VALUE.unpack_from(response, 4)[0]
             major = (firmware_version >> 8) & 0xFF
             minor = firmware_version & 0xFF
             
@@ -131,12 +133,15 @@ def main():
         # Attempt to connect to the specified port
         tester = HILTester(port=args.port, baudrate=args.baudrate)
         
-        # Try pinging 3 times
-        for attempt in range(3):
+        # Try pinging 3 times. Each ping already waits up to the port timeout
+        # for its reply, so retries only back off briefly (20, 40 ms)
+        max_attempts = 3
+        for attempt in range(1, max_attempts + 1):
             result = tester.ping()
             if result is not None:
                 break
-            time.sleep(0.5)
+            if attempt < max_attempts:
+                time.sleep(0.01 * 2 ** attempt)
         
         # Close connection
         tester.close()
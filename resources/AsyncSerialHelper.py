@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Serial Helper Library for Robot Framework
+
+This library talks to a serial port through pyserial-asyncio, so commands to
+several devices (e.g. the Illuminator and the HIL board, one library instance
+each) can be in flight at the same time from one event loop:
+
+    await asyncio.gather(
+        illuminator.send_command_and_get_response_async(command),
+        hil.send_binary_and_get_response_async(frame))
+
+The plain keywords (Open Serial Port, Send Command And Get Response, ...) run
+the same coroutines on a private event loop thread, so Robot suites can use
+the library like SerialHelper; the *_async coroutines are not keywords. Use either the coroutines from your own event
+loop or the plain keywords for a given port, not both.
+"""
+
+import asyncio
+import threading
+
+# pyserial-asyncio (listed in requirements.txt) is only needed once a port is
+# opened, so the library still imports without it
+try:
+    import serial_asyncio
+except ImportError:
+    serial_asyncio = None
+
+# The coroutines can't be run as Robot keywords (before Robot Framework 7.1
+# calling one only creates an unawaited coroutine), so they are hidden from
+# Robot; the library still works without Robot for asyncio use
+try:
+    from robot.api.deco import not_keyword
+except ImportError:
+    def not_keyword(func):
+        return func
+
+from serial_utils import _loads, _dumps
+
+class AsyncSerialHelper:
+    """Asynchronous serial library for use with Robot Framework and asyncio"""
+    
+    ROBOT_LIBRARY_SCOPE = 'SUITE'
+    
+    def __init__(self):
+        """Initialize the library"""
+        self.reader = None
+        self.writer = None
+        self.port = None
+        self.baudrate = None
+        
+        # Event loop thread backing the plain (blocking) keywords
+        self._loop = None
+        self._loop_thread = None
+        
+        # Debug mode: print connection and protocol messages
+        self.debug = True
+    
+    @not_keyword
+    async def open_serial_port_async(self, port, baudrate=115200):
+        """
+        Open a serial connection to the specified port
+        
+        Args:
+            port: Serial port name (e.g., COM19, /dev/ttyUSB0)
+            baudrate: Baud rate (default: 115200)
+            
+        Returns:
+            True if connection successful, False otherwise
+        """
+        if serial_asyncio is None:
+            raise Exception("AsyncSerialHelper requires pyserial-asyncio (pip install pyserial-asyncio)")
+        
+        await self.close_serial_port_async()
+        
+        self._log(f"Attempting to open port {port} at {baudrate} baud")
+        try:
+            self.reader, self.writer = await serial_asyncio.open_serial_connection(
+                url=port, baudrate=int(baudrate))
+        except OSError as e:
+            # serial.SerialException is an OSError subclass
+            self._log(f"Error opening port {port}: {str(e)}")
+            return False
+        
+        self.port = port
+        self.baudrate = baudrate
+        
+        self._log(f"Successfully opened port {port}")
+        return True
+    
+    @not_keyword
+    async def close_serial_port_async(self):
+        """Close the current serial connection if open"""
+        if self.writer is not None:
+            self._log(f"Closing port {self.port}")
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = None
+            self.writer = None
+    
+    @not_keyword
+    async def send_command_and_get_response_async(self, command_json, timeout=5.0):
+        """
+        Send a JSON command and wait for the newline-terminated response
+        
+        Args:
+            command_json: JSON command string or dictionary
+            timeout: Response timeout in seconds
+            
+        Returns:
+            Dictionary parsed from JSON response
+        """
+        if not self.is_port_open():
+            raise Exception("Serial port is not open")
+        
+        self.writer.write(self._encode_command(command_json))
+        await self.writer.drain()
+        
+        try:
+            response_bytes = await asyncio.wait_for(self.reader.readuntil(b'\n'), float(timeout))
+        except asyncio.TimeoutError:
+            # Drop any partial line so the next response starts clean
+            await self._discard_input()
+            response_bytes = b''
+        
+        # Parse and return JSON
+        try:
+            return _loads(response_bytes)
+        except ValueError:
+            # JSONDecodeError, or UnicodeDecodeError for non UTF-8 data
+            response_str = response_bytes.decode('utf-8', errors='replace')
+            self._log(f"Invalid JSON response: {response_str}")
+            return {"error": "Invalid JSON response", "raw_data": response_str}
+    
+    @not_keyword
+    async def send_binary_and_get_response_async(self, data, size=8, timeout=5.0):
+        """
+        Send a binary command (e.g. a HIL frame) and read a fixed-size response
+        
+        Args:
+            data: Binary command as bytes or bytearray
+            size: Response length in bytes (default: 8, one HIL frame)
+            timeout: Response timeout in seconds
+            
+        Returns:
+            Bytes response (empty if it did not arrive in time)
+        """
+        if not self.is_port_open():
+            raise Exception("Serial port is not open")
+        
+        self.writer.write(data)
+        await self.writer.drain()
+        
+        try:
+            return await asyncio.wait_for(self.reader.readexactly(int(size)), float(timeout))
+        except asyncio.TimeoutError:
+            # A partial frame stays in the reader after the timeout; drop it
+            # so later responses stay aligned on frame boundaries
+            await self._discard_input()
+            return b''
+    
+    def open_serial_port(self, port, baudrate=115200):
+        """Blocking form of open_serial_port_async"""
+        return self._run(self.open_serial_port_async(port, baudrate))
+    
+    def close_serial_port(self):
+        """Blocking form of close_serial_port_async; also stops the event loop thread"""
+        if self._loop is None:
+            return
+        self._run(self.close_serial_port_async())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join(timeout=1.0)
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+    
+    def is_port_open(self):
+        """Check if the port is currently open"""
+        return self.writer is not None and not self.writer.is_closing()
+    
+    def send_command_and_get_response(self, command_json, timeout=5.0):
+        """Blocking form of send_command_and_get_response_async"""
+        return self._run(self.send_command_and_get_response_async(command_json, timeout))
+    
+    def send_binary_and_get_response(self, data, size=8, timeout=5.0):
+        """Blocking form of send_binary_and_get_response_async"""
+        return self._run(self.send_binary_and_get_response_async(data, size, timeout))
+    
+    @staticmethod
+    def _encode_command(command_json):
+        """Encode a JSON command string or dictionary as a newline-terminated line"""
+        if isinstance(command_json, dict):
+            return _dumps(command_json) + b'\n'
+        
+        # Bytes are taken as already encoded, as in SerialHelper
+        if isinstance(command_json, (bytes, bytearray, memoryview)):
+            return command_json
+        
+        # Ensure we have a newline at the end
+        if not command_json.endswith('\n'):
+            command_json += '\n'
+        return command_json.encode('utf-8')
+    
+    async def _discard_input(self):
+        """Drop everything received so far, in the reader and the driver"""
+        self.writer.transport.serial.reset_input_buffer()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self.reader.read(4096), 0.001)
+            except asyncio.TimeoutError:
+                return
+            if not chunk:
+                # End of stream
+                return
+    
+    def _run(self, coro):
+        """Run a coroutine on the library's event loop thread and wait for it"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(
+                target=self._loop.run_forever, name="async-serial-loop", daemon=True)
+            self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def _log(self, message):
+        """Internal logging function"""
+        if self.debug:
+            print(message)
@@ -9,6 +9,148 @@ serial connection.
 
 import struct
 import time
+import functools
+import collections
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from serial_utils import _format_hex
+
+# START + CMD + LIGHT + SIGNAL + VALUE_LOW + VALUE_HIGH + CHECKSUM + END
+_FRAME_STRUCT = struct.Struct('<BBBBBBBB')
+
+# Batches at least this large are built with NumPy (when installed); below
+# it the per-call NumPy overhead outweighs the vectorized checksum
+_NUMPY_BATCH_MIN = 16
+
+# One-character strings for every byte value, so decoding a light/signal
+# byte is a tuple index instead of a chr() call
+_CHR = tuple(map(chr, range(256)))
+
+def _fast_int(x):
+    """int(x), skipping the conversion for values that already are ints"""
+    return x if type(x) is int else int(x)
+
+@functools.lru_cache(maxsize=256)
+def _build_frame(cmd_byte, light_byte, signal_byte, value):
+    """Build (and memoize) the frame for one command; all arguments are ints"""
+    if not 0 <= value <= 0xFFFF:
+        raise struct.error(f"HIL value out of 16-bit range: {value}")
+    
+    value_low = value & 0xFF
+    value_high = (value >> 8) & 0xFF
+    
+    # Checksum is the XOR of all data bytes
+    checksum = cmd_byte ^ light_byte ^ signal_byte ^ value_low ^ value_high
+    
+    return _FRAME_STRUCT.pack(
+        ImprovedHILProtocol.START_MARKER,  # Start marker
+        cmd_byte,                          # Command type
+        light_byte,                        # Light ID
+        signal_byte,                       # Signal type
+        value_low,                         # Value (low byte)
+        value_high,                        # Value (high byte)
+        checksum,                          # Checksum
+        ImprovedHILProtocol.END_MARKER     # End marker
+    )
+
+def _build_frames_numpy(rows):
+    """
+    Build the frames for (cmd_byte, light_byte, signal_byte, value) rows
+    in one vectorized pass; returns the concatenated frames as bytes
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if rows[:, :3].min() < 0 or rows[:, :3].max() > 0xFF:
+        raise struct.error("HIL command byte out of range")
+    if rows[:, 3].min() < 0 or rows[:, 3].max() > 0xFFFF:
+        raise struct.error("HIL value out of 16-bit range")
+    
+    frames = np.empty((len(rows), 8), dtype=np.uint8)
+    frames[:, 0] = ImprovedHILProtocol.START_MARKER
+    frames[:, 1:4] = rows[:, :3]
+    frames[:, 4] = rows[:, 3] & 0xFF
+    frames[:, 5] = rows[:, 3] >> 8
+    # Checksum is the XOR of all data bytes
+    frames[:, 6] = np.bitwise_xor.reduce(frames[:, 1:6], axis=1)
+    frames[:, 7] = ImprovedHILProtocol.END_MARKER
+    return frames.tobytes()
+
+def _parse_frame(frame):
+    """Decode an 8-byte frame into (response_type, light_byte, signal_byte, value)"""
+    (_, response_type, light_byte, signal_byte,
+     value_low, value_high, _, _) = _FRAME_STRUCT.unpack_from(frame)
+    
+    # Combine value bytes (little endian)
+    return response_type, light_byte, signal_byte, value_low | (value_high << 8)
+
+# Response status codes used internally by the protocol helper
+HIL_OK, HIL_ERR, HIL_BAD_LEN, HIL_BAD_MARK, HIL_UNKNOWN = range(5)
+
+class _HilResponse(collections.namedtuple('_HilResponse', 'status light signal value',
+                                          defaults=(None, None, None))):
+    """Compact parsed HIL response; to_dict() gives the keyword-facing shape"""
+    
+    __slots__ = ()
+    
+    def to_dict(self):
+        """Convert to the dictionary returned by the public keywords"""
+        if self.status == HIL_OK:
+            if self.light is None:
+                return {'status': 'ok'}
+            return {
+                'status': 'ok',
+                'light': self.light,
+                'signal': self.signal,
+                'value': self.value
+            }
+        if self.status == HIL_ERR:
+            return {'status': 'error'}
+        if self.status == HIL_BAD_LEN:
+            return {'error': 'Response too short'}
+        if self.status == HIL_BAD_MARK:
+            return {'error': 'Invalid markers'}
+        # HIL_UNKNOWN carries the unexpected response type byte as its value
+        return {'error': f'Unknown response type: {_CHR[self.value]}'}
+
+# Shared instances for the responses that carry no data
+_RESP_OK = _HilResponse(HIL_OK)
+_RESP_ERR = _HilResponse(HIL_ERR)
+_RESP_BAD_LEN = _HilResponse(HIL_BAD_LEN)
+_RESP_BAD_MARK = _HilResponse(HIL_BAD_MARK)
+
+def _parse_ok(response_bytes):
+    """A simple OK response"""
+    return _RESP_OK
+
+def _parse_error(response_bytes):
+    """An error response"""
+    return _RESP_ERR
+
+def _parse_data(response_bytes):
+    """A response echoing the command type (G, S, P) with a value"""
+    if len(response_bytes) != 8:
+        return _parse_unknown(response_bytes)
+    
+    # Decode the whole frame in one call
+    _, light_byte, signal_byte, value = _parse_frame(response_bytes)
+    
+    # Scale value based on signal type
+    if signal_byte == ImprovedHILProtocol._SIGNAL_PWM_BYTE:
+        # PWM is 0-100%
+        # For PWM, the response is typically 0-100 directly
+        # If the raw value is higher, scale it
+        if value > 100:
+            scaled_value = (value / 32767) * 100
+            value = round(scaled_value, 1)
+    
+    return _HilResponse(HIL_OK, _CHR[light_byte], _CHR[signal_byte], value)
+
+def _parse_unknown(response_bytes):
+    """Unknown response type"""
+    return _HilResponse(HIL_UNKNOWN, value=response_bytes[1])
 
 class ImprovedHILProtocol:
     """Helper class for HIL protocol operations with dedicated serial connection"""
@@ -31,6 +173,27 @@ class ImprovedHILProtocol:
     # Response status
     RESPONSE_OK = 'O'
     RESPONSE_ERROR = 'N'
+    
+    # Byte values of the constants above, evaluated once for the parser
+    _RESPONSE_OK_BYTE = ord(RESPONSE_OK)
+    _RESPONSE_ERROR_BYTE = ord(RESPONSE_ERROR)
+    _COMMAND_BYTES = frozenset((ord(CMD_GET), ord(CMD_SET), ord(CMD_PING)))
+    _SIGNAL_PWM_BYTE = ord(SIGNAL_PWM)
+    _CMD_GET_BYTE = ord(CMD_GET)
+    _CMD_SET_BYTE = ord(CMD_SET)
+    _CMD_PING_BYTE = ord(CMD_PING)
+    _SIGNAL_CURRENT_BYTE = ord(SIGNAL_CURRENT)
+    _SIGNAL_TEMPERATURE_BYTE = ord(SIGNAL_TEMPERATURE)
+    _SIGNAL_SYSTEM_BYTE = ord(SIGNAL_SYSTEM)
+    _LIGHT_SYSTEM_BYTE = ord('S')
+    
+    # Response type byte -> parser used by parse_response
+    _RESPONSE_HANDLERS = dict.fromkeys(_COMMAND_BYTES, _parse_data)
+    _RESPONSE_HANDLERS[_RESPONSE_OK_BYTE] = _parse_ok
+    _RESPONSE_HANDLERS[_RESPONSE_ERROR_BYTE] = _parse_error
+    
+    # Light ID byte for single-digit IDs given as int or str (1 or '1' -> 0x31)
+    _LIGHT_BYTES = {key: ord(str(digit)) for digit in range(10) for key in (digit, str(digit))}
 
     def __init__(self, serial_helper=None):
         """
@@ -77,6 +240,11 @@ class ImprovedHILProtocol:
         Returns:
             Bytes object containing the complete command frame
         """
+        return self._create_command_fast(*self._normalize(cmd_type, light_id, signal_type, value))
+    
+    @staticmethod
+    def _normalize(cmd_type, light_id, signal_type, value):
+        """Convert create_command arguments to (cmd, light, signal, value) ints"""
         # Convert light_id to string if it's a number
         if isinstance(light_id, int):
             light_id = str(light_id)
@@ -86,27 +254,15 @@ class ImprovedHILProtocol:
         light_byte = ord(light_id) if isinstance(light_id, str) else light_id
         signal_byte = ord(signal_type) if isinstance(signal_type, str) else signal_type
         
-        # Ensure value is an integer
-        value = int(value)
-        value_bytes = struct.pack("<H", value)  # Little-endian 16-bit value
-        
-        # Calculate checksum (XOR of all data bytes)
-        checksum = cmd_byte ^ light_byte ^ signal_byte ^ value_bytes[0] ^ value_bytes[1]
-        
-        # Create command frame
-        command = bytearray([
-            self.START_MARKER,  # Start marker
-            cmd_byte,           # Command type
-            light_byte,         # Light ID
-            signal_byte,        # Signal type
-            value_bytes[0],     # Value (low byte)
-            value_bytes[1],     # Value (high byte)
-            checksum,           # Checksum
-            self.END_MARKER     # End marker
-        ])
+        return cmd_byte, light_byte, signal_byte, _fast_int(value)
+    
+    def _create_command_fast(self, cmd_byte, light_byte, signal_byte, value):
+        """create_command for arguments that are already byte values (ints)"""
+        # Repeated commands (e.g. polling the same PWM) come from the cache
+        command = _build_frame(cmd_byte, light_byte, signal_byte, value)
         
         if self.debug:
-            cmd_str = ' '.join([f'0x{b:02X}' for b in command])
+            cmd_str = _format_hex(command)
             print(f"HIL Command: {cmd_str}")
         
         return command
@@ -121,59 +277,24 @@ class ImprovedHILProtocol:
         Returns:
             Dictionary with parsed response data
         """
+        return self._parse(response_bytes).to_dict()
+    
+    def _parse(self, response_bytes):
+        """Parse a HIL response into a _HilResponse (no dict allocation)"""
         if self.debug and response_bytes:
-            resp_str = ' '.join([f'0x{b:02X}' for b in response_bytes])
+            resp_str = _format_hex(response_bytes)
             print(f"HIL Response: {resp_str}")
             
         # Check if response has valid length
         if len(response_bytes) < 4:
-            return {'error': 'Response too short'}
+            return _RESP_BAD_LEN
             
         # Check start and end markers
         if response_bytes[0] != self.START_MARKER or response_bytes[-1] != self.END_MARKER:
-            return {'error': 'Invalid markers'}
-        
-        # Get response type (second byte)
-        response_type = response_bytes[1]
+            return _RESP_BAD_MARK
         
-        # Handle different response types
-        if response_type == ord('O') or response_type == ord(self.RESPONSE_OK):
-            # This is a simple OK response
-            return {'status': 'ok'}
-            
-        elif response_type == ord('N') or response_type == ord(self.RESPONSE_ERROR):
-            # This is an error response
-            return {'status': 'error'}
-            
-        # Handle response with the same command type (G, S, P)
-        elif response_type == ord('G') or response_type == ord('S') or response_type == ord('P'):
-            if len(response_bytes) == 8:
-                light_byte = response_bytes[2]  # Light ID
-                signal_byte = response_bytes[3] # Signal type
-                value_low = response_bytes[4]   # Value low byte
-                value_high = response_bytes[5]  # Value high byte
-                
-                # Combine value bytes (little endian)
-                value = value_low | (value_high << 8)
-                
-                # Scale value based on signal type
-                if chr(signal_byte) == self.SIGNAL_PWM:
-                    # PWM is 0-100%
-                    # For PWM, the response is typically 0-100 directly
-                    # If the raw value is higher, scale it
-                    if value > 100:
-                        scaled_value = (value / 32767) * 100
-                        value = round(scaled_value, 1)
-                
-                return {
-                    'status': 'ok',
-                    'light': chr(light_byte),
-                    'signal': chr(signal_byte),
-                    'value': value
-                }
-        
-        # Unknown response type
-        return {'error': f'Unknown response type: {chr(response_type)}'}
+        # Dispatch on the response type (second byte)
+        return self._RESPONSE_HANDLERS.get(response_bytes[1], _parse_unknown)(response_bytes)
     
     def send_command(self, cmd_type, light_id, signal_type, value):
         """
@@ -188,20 +309,88 @@ class ImprovedHILProtocol:
         Returns:
             Dictionary with parsed response data
         """
+        command = self.create_command(cmd_type, light_id, signal_type, value)
+        return self._send_frame(command).to_dict()
+    
+    def _light_command(self, cmd_byte, light_id, signal_byte, value):
+        """Build a frame for a light ID as given by a caller (int or str)"""
+        light_byte = self._LIGHT_BYTES.get(light_id)
+        if light_byte is None:
+            # Unusual ID - let create_command normalize (or reject) it
+            return self.create_command(cmd_byte, light_id, signal_byte, value)
+        return self._create_command_fast(cmd_byte, light_byte, signal_byte, value)
+    
+    def _send_frame(self, command):
+        """Send a command frame and return the response as a _HilResponse"""
         if not self.serial:
             raise ValueError("Serial helper is not set")
             
         if not self.serial.is_hil_connected():
             raise ConnectionError("HIL serial port is not connected")
         
-        # Create command
-        command = self.create_command(cmd_type, light_id, signal_type, value)
-        
         # Send command and get response
         response = self.serial.send_hil_command(command)
         
         # Parse response
-        return self.parse_response(response)
+        return self._parse(response)
+    
+    def send_commands_batch(self, commands):
+        """
+        Send several commands to the HIL board in a single round trip
+        
+        Requires firmware that accepts back-to-back frames; responses are
+        matched to commands by order.
+        
+        Args:
+            commands: List of (cmd_type, light_id, signal_type, value) tuples
+                (batches of 16 or more are built with NumPy when available)
+            
+        Returns:
+            List of dictionaries with parsed response data, one per command
+        """
+        rows = [self._normalize(*command) for command in commands]
+        
+        if np is not None and len(rows) >= _NUMPY_BATCH_MIN:
+            # Large batch: build every frame (and checksum) in one NumPy pass
+            frames = _build_frames_numpy(rows)
+            if self.debug:
+                print(f"HIL Commands (batch of {len(rows)}): {_format_hex(frames)}")
+        else:
+            frames = [self._create_command_fast(*row) for row in rows]
+        
+        return [response.to_dict() for response in self._send_frames(frames)]
+    
+    def _send_frames(self, frames):
+        """Send a batch of command frames and return a list of _HilResponse"""
+        if not self.serial:
+            raise ValueError("Serial helper is not set")
+            
+        if not self.serial.is_hil_connected():
+            raise ConnectionError("HIL serial port is not connected")
+        
+        responses = self.serial.send_hil_commands_batch(frames)
+        return [self._parse(response) for response in responses]
+    
+    def read_all_pwm_duty_cycles(self, light_ids=(1, 2, 3)):
+        """
+        Get PWM duty cycles for several lights in one batch
+        
+        Args:
+            light_ids: Light IDs to measure (default: 1, 2, 3)
+            
+        Returns:
+            List of PWM duty cycles (0-100%) in light ID order, None for errors
+        """
+        frames = [self._light_command(self._CMD_GET_BYTE, light_id, self._SIGNAL_PWM_BYTE, 0)
+                  for light_id in light_ids]
+        duty_cycles = []
+        for light_id, response in zip(light_ids, self._send_frames(frames)):
+            if response.status == HIL_OK and response.value is not None:
+                duty_cycles.append(response.value)
+            else:
+                print(f"Error getting PWM duty cycle for light {light_id}: {response.to_dict()}")
+                duty_cycles.append(None)
+        return duty_cycles
     
     def get_pwm_duty_cycle(self, light_id):
         """
@@ -213,12 +402,13 @@ class ImprovedHILProtocol:
         Returns:
             PWM duty cycle (0-100%), or None if error
         """
-        response = self.send_command(self.CMD_GET, light_id, self.SIGNAL_PWM, 0)
+        response = self._send_frame(
+            self._light_command(self._CMD_GET_BYTE, light_id, self._SIGNAL_PWM_BYTE, 0))
         
-        if response.get('status') == 'ok' and 'value' in response:
-            return response.get('value')
+        if response.status == HIL_OK and response.value is not None:
+            return response.value
         else:
-            print(f"Error getting PWM duty cycle: {response}")
+            print(f"Error getting PWM duty cycle: {response.to_dict()}")
             return None
     
     def set_current_simulation(self, light_id, current_ma):
@@ -234,17 +424,22 @@ class ImprovedHILProtocol:
         """
         # Ensure both arguments are integers
         try:
-            light_id = int(light_id)
-            current_ma = int(current_ma)
+            light_id = _fast_int(light_id)
+            current_ma = _fast_int(current_ma)
         except (ValueError, TypeError):
             print(f"Error converting arguments to integers: light_id={light_id}, current_ma={current_ma}")
             return False
         
-        # Scale current_ma by 100 to match hardware expectations (1000mA = 10)
-        scaled_value = int(current_ma / 100)
+        # Scale current_ma by 100 to match hardware expectations (1000mA = 10);
+        # integer division truncating toward zero, like int(current_ma / 100)
+        if current_ma >= 0:
+            scaled_value = current_ma // 100
+        else:
+            scaled_value = -(-current_ma // 100)
         
-        response = self.send_command(self.CMD_SET, light_id, self.SIGNAL_CURRENT, scaled_value)
-        return response.get('status') == 'ok'
+        response = self._send_frame(
+            self._light_command(self._CMD_SET_BYTE, light_id, self._SIGNAL_CURRENT_BYTE, scaled_value))
+        return response.status == HIL_OK
 
     def set_temperature_simulation(self, light_id, temperature_c):
         """
@@ -259,20 +454,25 @@ class ImprovedHILProtocol:
         """
         # Ensure light_id is an integer
         try:
-            light_id = int(light_id)
-            temperature_c = float(temperature_c)
+            light_id = _fast_int(light_id)
+            # Whole degrees (the usual case) need no float round trip
+            if type(temperature_c) is not int:
+                temperature_c = float(temperature_c)
         except (ValueError, TypeError):
             print(f"Error converting arguments to numbers: light_id={light_id}, temperature_c={temperature_c}")
             return False
         
-        # Scale temperature from 0-330°C to 0-32767 value if needed
+        # Scale temperature from 0-330°C to 0-32767 value if needed. Anything
+        # above 32767 scales to far more than 32767 (t / 330 * 32767 > 3e6),
+        # so that branch always saturates
         if temperature_c > 32767:
-            scaled_value = min(32767, int((temperature_c / 330) * 32767))
+            scaled_value = 32767
         else:
-            scaled_value = int(temperature_c)
+            scaled_value = _fast_int(temperature_c)
                 
-        response = self.send_command(self.CMD_SET, light_id, self.SIGNAL_TEMPERATURE, scaled_value)
-        return response.get('status') == 'ok'
+        response = self._send_frame(
+            self._light_command(self._CMD_SET_BYTE, light_id, self._SIGNAL_TEMPERATURE_BYTE, scaled_value))
+        return response.status == HIL_OK
     
     def ping(self):
         """
@@ -281,7 +481,8 @@ class ImprovedHILProtocol:
         Returns:
             Response dictionary including firmware version if successful
         """
-        response = self.send_command(self.CMD_PING, 'S', self.SIGNAL_SYSTEM, 0)
+        response = self._send_frame(self._create_command_fast(
+            self._CMD_PING_BYTE, self._LIGHT_SYSTEM_BYTE, self._SIGNAL_SYSTEM_BYTE, 0)).to_dict()
         
         if self.debug:
             if response.get('status') == 'ok':
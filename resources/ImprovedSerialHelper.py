@@ -9,8 +9,30 @@ supporting both text-based JSON protocol (Illuminator) and binary protocol (HIL)
 import time
 import json
 import struct
+import queue
+import threading
+import contextlib
 import serial
-import serial.tools.list_ports
+
+from serial_utils import configure_port, scan_ports, read_line, set_timeout, _format_hex, _loads, _dumps
+
+# HIL frame markers, used by the background reader to find frame boundaries
+_HIL_START_MARKER = 0xAA
+_HIL_END_MARKER = 0x55
+_HIL_FRAME_SIZE = 8
+
+# OK / NOT OK replies may also be a 4-byte minimal frame: AA, 'O'|'N', light, 55
+_HIL_MINIMAL_SIZE = 4
+_HIL_MINIMAL_TYPES = (ord('O'), ord('N'))
+
+def _is_minimal_frame(data):
+    """True if data is a complete 4-byte minimal OK/NOT OK frame"""
+    return (len(data) == _HIL_MINIMAL_SIZE and data[0] == _HIL_START_MARKER
+            and data[1] in _HIL_MINIMAL_TYPES and data[3] == _HIL_END_MARKER)
+
+def _encode_illuminator(command_dict):
+    """Serialize a command to a newline-terminated JSON line (bytes)"""
+    return _dumps(command_dict) + b'\n'
 
 class ImprovedSerialHelper:
     """Improved Serial library for use with Robot Framework supporting multiple devices"""
@@ -23,6 +45,11 @@ class ImprovedSerialHelper:
         self.illuminator_serial = None
         self.hil_serial = None
         
+        # Connection state, maintained by open/close so the per-command
+        # checks don't go through the pyserial is_open property
+        self._illuminator_open = False
+        self._hil_open = False
+        
         # Connection parameters for each device
         self.illuminator_port = None
         self.illuminator_baudrate = None
@@ -32,6 +59,14 @@ class ImprovedSerialHelper:
         self.hil_baudrate = None
         self.hil_timeout = None
         
+        # Bytes received from the Illuminator but not yet returned as a line
+        self._illum_rxbuf = bytearray()
+        
+        # Optional background reader for the HIL port
+        self._hil_rx_thread = None
+        self._hil_rx_stop = None
+        self._hil_rx_queue = None
+        
         # Debug mode
         self.debug = True
     
@@ -47,6 +82,17 @@ class ImprovedSerialHelper:
         Returns:
             True if connection successful, False otherwise
         """
+        # Keep an already open port with identical settings; reopening costs
+        # tens of milliseconds of driver initialisation on Windows
+        if (self.is_illuminator_connected() and self.illuminator_port == port
+                and int(self.illuminator_baudrate) == int(baudrate)
+                and float(self.illuminator_timeout) == float(timeout)):
+            self._log(f"Illuminator port {port} already open with the requested settings")
+            # Start from a clean receive buffer as a fresh open would
+            self.illuminator_serial.reset_input_buffer()
+            self._illum_rxbuf.clear()
+            return True
+        
         try:
             # Close existing connection if any
             self.close_illuminator_connection()
@@ -61,10 +107,12 @@ class ImprovedSerialHelper:
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE
             )
+            configure_port(self.illuminator_serial, port)
             
             self.illuminator_port = port
             self.illuminator_baudrate = baudrate
             self.illuminator_timeout = timeout
+            self._illuminator_open = True
             
             self._log(f"Successfully opened Illuminator port {port}")
             return True
@@ -74,7 +122,7 @@ class ImprovedSerialHelper:
             self.list_available_ports()
             return False
     
-    def open_hil_connection(self, port, baudrate=115200, timeout=5.0):
+    def open_hil_connection(self, port, baudrate=115200, timeout=5.0, background_reader=False):
         """
         Open a dedicated serial connection to the HIL hardware
         
@@ -82,10 +130,25 @@ class ImprovedSerialHelper:
             port: Serial port name (e.g., COM20, /dev/ttyUSB1)
             baudrate: Baud rate (default: 115200)
             timeout: Read timeout in seconds (default: 5.0)
+            background_reader: Drain the port on a background thread and
+                queue complete response frames (default: False)
             
         Returns:
             True if connection successful, False otherwise
         """
+        # Keep an already open port with identical settings (see
+        # open_illuminator_connection)
+        if (self.is_hil_connected() and self.hil_port == port
+                and int(self.hil_baudrate) == int(baudrate)
+                and float(self.hil_timeout) == float(timeout)
+                and (self._hil_rx_thread is not None) == bool(background_reader)):
+            self._log(f"HIL port {port} already open with the requested settings")
+            # Start from a clean receive buffer as a fresh open would
+            self.hil_serial.reset_input_buffer()
+            if self._hil_rx_thread is not None:
+                self._drain_hil_queue()
+            return True
+        
         try:
             # Close existing connection if any
             self.close_hil_connection()
@@ -100,10 +163,15 @@ class ImprovedSerialHelper:
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE
             )
+            configure_port(self.hil_serial, port)
             
             self.hil_port = port
             self.hil_baudrate = baudrate
             self.hil_timeout = timeout
+            self._hil_open = True
+            
+            if background_reader:
+                self._start_hil_reader()
             
             self._log(f"Successfully opened HIL port {port}")
             return True
@@ -115,15 +183,19 @@ class ImprovedSerialHelper:
     
     def close_illuminator_connection(self):
         """Close the Illuminator serial connection if open"""
+        self._illuminator_open = False
         if self.illuminator_serial and self.illuminator_serial.is_open:
             self._log(f"Closing Illuminator port {self.illuminator_port}")
             self.illuminator_serial.close()
             self.illuminator_serial = None
+            self._illum_rxbuf.clear()
     
     def close_hil_connection(self):
         """Close the HIL serial connection if open"""
+        self._hil_open = False
         if self.hil_serial and self.hil_serial.is_open:
             self._log(f"Closing HIL port {self.hil_port}")
+            self._stop_hil_reader()
             self.hil_serial.close()
             self.hil_serial = None
     
@@ -134,82 +206,157 @@ class ImprovedSerialHelper:
     
     def is_illuminator_connected(self):
         """Check if Illuminator port is currently open"""
-        return self.illuminator_serial is not None and self.illuminator_serial.is_open
+        return self._illuminator_open
     
     def is_hil_connected(self):
         """Check if HIL port is currently open"""
-        return self.hil_serial is not None and self.hil_serial.is_open
+        return self._hil_open
+    
+    @contextlib.contextmanager
+    def _illuminator_io(self):
+        """Run Illuminator port I/O, marking the connection lost if the device went away"""
+        try:
+            yield
+        except serial.SerialException:
+            # Report it as disconnected from now on
+            self._illuminator_open = False
+            raise
+    
+    @contextlib.contextmanager
+    def _hil_io(self):
+        """Run HIL port I/O, marking the connection lost if the device went away"""
+        try:
+            yield
+        except serial.SerialException:
+            # Report it as disconnected from now on
+            self._hil_open = False
+            raise
+    
+    def make_illuminator_cmd(self, cmd_id, topic, action, data=None, cmd_type='cmd'):
+        """
+        Build an Illuminator command dictionary
+        
+        Args:
+            cmd_id: Command ID, echoed back in the response
+            topic: Command topic (e.g., system, light, status, alarm)
+            action: Command action (e.g., ping, set, get_all)
+            data: Command payload as a dictionary or list, or as a JSON
+                string (as written in Robot files) which is parsed here
+                (default: empty payload)
+            cmd_type: Message type (default: cmd)
+            
+        Returns:
+            Command dictionary for send_illuminator_command
+        """
+        if data is None:
+            data = {}
+        elif isinstance(data, str):
+            try:
+                data = _loads(data)
+            except json.JSONDecodeError:
+                raise ValueError(f"Command data is not valid JSON: {data}")
+        
+        return {
+            'type': cmd_type,
+            'id': cmd_id,
+            'topic': topic,
+            'action': action,
+            'data': data
+        }
     
-    def send_illuminator_command(self, command_dict, timeout=5.0):
+    def send_illuminator_command(self, command_dict, timeout=None):
         """
         Send a JSON command to the Illuminator and get the response
         
         Args:
-            command_dict: JSON command string or dictionary
-            timeout: Read timeout in seconds
+            command_dict: JSON command string, or dictionary whose data field
+                is already structured (see make_illuminator_cmd)
+            timeout: Read timeout in seconds (default: the timeout the port
+                was opened with)
             
         Returns:
             Dictionary parsed from JSON response
         """
+        self.write_illuminator_command(command_dict)
+        return self.read_illuminator_response(timeout)
+    
+    def write_illuminator_command(self, command_dict):
+        """
+        Send a JSON command to the Illuminator without waiting for the reply
+        
+        The reply stays in the driver buffer until read_illuminator_response
+        is called, so other work (e.g. HIL measurements) can be done while
+        the Illuminator processes the command.
+        
+        Args:
+            command_dict: JSON command string, or dictionary whose data field
+                is already structured (see make_illuminator_cmd)
+        """
         if not self.is_illuminator_connected():
             raise Exception("Illuminator serial port is not open")
         
-        # If data field is a string that looks like JSON, parse it
-        if isinstance(command_dict, dict) and 'data' in command_dict and isinstance(command_dict['data'], str):
-            if command_dict['data'].startswith('{') and command_dict['data'].endswith('}'):
-                try:
-                    command_dict['data'] = json.loads(command_dict['data'])
-                except json.JSONDecodeError:
-                    # Keep it as a string if it can't be parsed
-                    pass
-
-        # Convert dict to string if needed
+        # Dicts are encoded straight to the wire bytes
         if isinstance(command_dict, dict):
-            command_str = json.dumps(command_dict)
+            command_bytes = _encode_illuminator(command_dict)
         else:
-            command_str = command_dict
-        
-        # Ensure we have a newline at the end
-        if not command_str.endswith('\n'):
-            command_str += '\n'
+            # Ensure we have a newline at the end
+            if not command_dict.endswith('\n'):
+                command_dict += '\n'
+            command_bytes = command_dict.encode('utf-8')
         
-        self._log(f"ILLUMINATOR TX: {command_str.strip()}")
+        if self.debug:
+            self._log(f"ILLUMINATOR TX: {command_bytes.decode('utf-8').strip()}")
         
         # Send the command
-        self.illuminator_serial.write(command_str.encode('utf-8'))
+        with self._illuminator_io():
+            self.illuminator_serial.write(command_bytes)
+    
+    def read_illuminator_response(self, timeout=None):
+        """
+        Read the reply to a command sent with write_illuminator_command
+        
+        Args:
+            timeout: Read timeout in seconds (default: the timeout the port
+                was opened with)
+            
+        Returns:
+            Dictionary parsed from JSON response
+        """
+        if not self.is_illuminator_connected():
+            raise Exception("Illuminator serial port is not open")
         
         # Get the response with the specified timeout
         original_timeout = self.illuminator_serial.timeout
         try:
             if timeout is not None:
-                self.illuminator_serial.timeout = float(timeout)
+                set_timeout(self.illuminator_serial, timeout)
             
-            try:
-                response_raw = self.illuminator_serial.readline()
-                response_str = response_raw.decode('utf-8', errors='replace').strip()
-            except UnicodeDecodeError:
-                self._log(f"Warning: Received binary data that can't be decoded as UTF-8")
-                # Option 1: Return the raw bytes
-                return {"error": "Binary data received", "raw_data": response_raw}
-            self._log(f"ILLUMINATOR RX: {response_str}")
+            with self._illuminator_io():
+                response_raw = read_line(self.illuminator_serial, self._illum_rxbuf)
+            if self.debug:
+                self._log(f"ILLUMINATOR RX: {response_raw.decode('utf-8', errors='replace').strip()}")
             
-            # Parse and return JSON
+            # Parse and return JSON; the raw line is parsed as bytes, so it is
+            # only decoded to text for logging or error reporting
             try:
-                return json.loads(response_str)
-            except json.JSONDecodeError:
+                return _loads(response_raw)
+            except ValueError:
+                # JSONDecodeError, or UnicodeDecodeError from json.loads on bytes
+                response_str = response_raw.decode('utf-8', errors='replace').strip()
                 self._log(f"Invalid JSON response from Illuminator: {response_str}")
                 return {"error": "Invalid JSON response", "raw_data": response_str}
         finally:
             # Restore original timeout
-            self.illuminator_serial.timeout = original_timeout
+            set_timeout(self.illuminator_serial, original_timeout)
     
-    def send_hil_command(self, command, timeout=5.0):
+    def send_hil_command(self, command, timeout=None):
         """
         Send a binary command to the HIL board and get the response
         
         Args:
             command: Binary command as bytes or bytearray
-            timeout: Read timeout in seconds
+            timeout: Read timeout in seconds (default: the timeout the port
+                was opened with)
             
         Returns:
             Bytes response
@@ -219,41 +366,264 @@ class ImprovedSerialHelper:
         
         # Debug log the command bytes
         if self.debug:
-            cmd_bytes = ' '.join([f'0x{b:02X}' for b in command])
+            cmd_bytes = _format_hex(command)
             self._log(f"HIL TX: {cmd_bytes}")
         
+        # Drop replies that arrived after an earlier command timed out, so
+        # they can't be taken as this command's response
+        if self._hil_rx_thread is not None:
+            self._drain_hil_queue()
+        
         # Send the command
-        self.hil_serial.write(command)
+        with self._hil_io():
+            self.hil_serial.write(command)
         
-        # Wait for processing
-        time.sleep(0.1)
+        if self._hil_rx_thread is not None:
+            response = self._get_hil_frame(self._hil_deadline(timeout))
+            
+            # Debug log the response bytes
+            if self.debug and response:
+                resp_bytes = _format_hex(response)
+                self._log(f"HIL RX: {resp_bytes}")
+            
+            return response
         
-        # Read the response with the specified timeout
+        # Read the response with the specified timeout. The reads return as
+        # soon as the frame has arrived; any settle time the HIL firmware needs
+        # is its own to absorb before it replies.
         original_timeout = self.hil_serial.timeout
         try:
             if timeout is not None:
-                self.hil_serial.timeout = float(timeout)
+                set_timeout(self.hil_serial, timeout)
             
-            # Read response (8 bytes for HIL protocol)
-            response = self.hil_serial.read(8)
+            with self._hil_io():
+                response = self._read_hil_frame()
+            
+            if 0 < len(response) < _HIL_FRAME_SIZE and not _is_minimal_frame(response):
+                # Timed out mid-frame: drop whatever arrived so the next
+                # command's response starts on a frame boundary
+                self.hil_serial.reset_input_buffer()
             
             # Debug log the response bytes
             if self.debug and response:
-                resp_bytes = ' '.join([f'0x{b:02X}' for b in response])
+                resp_bytes = _format_hex(response)
                 self._log(f"HIL RX: {resp_bytes}")
             
             return response
         finally:
             # Restore original timeout
-            self.hil_serial.timeout = original_timeout
+            set_timeout(self.hil_serial, original_timeout)
     
-    def list_available_ports(self):
-        """List all available serial ports"""
-        ports = list(serial.tools.list_ports.comports())
+    def send_hil_commands_batch(self, commands, timeout=None):
+        """
+        Send several binary commands to the HIL board in one write and read
+        all responses back
+        
+        The HIL board answers in the order commands were received, so this
+        costs one round trip instead of one per command.
+        
+        Args:
+            commands: List of binary commands (bytes or bytearray, 8 bytes each),
+                or one bytes-like buffer holding the frames back to back
+            timeout: Read timeout in seconds for the whole batch
+                (default: the timeout the port was opened with, once per
+                command in the batch)
+            
+        Returns:
+            List with one bytes response per command (empty if it never arrived)
+        """
+        if not self.is_hil_connected():
+            raise Exception("HIL serial port is not open")
+        
+        if isinstance(commands, (bytes, bytearray, memoryview)):
+            frames = bytes(commands)
+        else:
+            frames = b''.join(commands)
+        count = len(frames) // _HIL_FRAME_SIZE
         
-        self._log(f"Found {len(ports)} serial ports:")
-        for i, port in enumerate(ports):
-            self._log(f"{i+1}. {port.device}: {port.description}")
+        # The port timeout is sized for one reply; give the batch that much
+        # per command
+        if timeout is None:
+            timeout = float(self.hil_timeout) * max(count, 1)
+        
+        # Debug log the command bytes
+        if self.debug:
+            cmd_bytes = _format_hex(frames)
+            self._log(f"HIL TX (batch of {count}): {cmd_bytes}")
+        
+        # Drop late replies to earlier commands (see send_hil_command)
+        if self._hil_rx_thread is not None:
+            self._drain_hil_queue()
+        
+        # Send all commands at once
+        with self._hil_io():
+            self.hil_serial.write(frames)
+        
+        if self._hil_rx_thread is not None:
+            deadline = self._hil_deadline(timeout)
+            responses = [self._get_hil_frame(deadline) for _ in range(count)]
+            
+            # Debug log the response bytes
+            if self.debug and any(responses):
+                resp_bytes = _format_hex(b''.join(responses))
+                self._log(f"HIL RX (batch of {count}): {resp_bytes}")
+            
+            return responses
+        
+        # Read all responses within the batch timeout
+        original_timeout = self.hil_serial.timeout
+        try:
+            # Replies are read frame by frame, since any of them may be a
+            # 4-byte minimal frame. Each read returns as soon as its frame is
+            # in and may only wait for what is left of the batch timeout;
+            # after a timeout the rest are reported as missing.
+            deadline = self._hil_deadline(timeout)
+            responses = []
+            with self._hil_io():
+                while len(responses) < count and time.monotonic() < deadline:
+                    response = self._read_hil_frame(deadline)
+                    responses.append(response)
+                    if len(response) < _HIL_FRAME_SIZE and not _is_minimal_frame(response):
+                        break
+            
+            last = responses[-1] if responses else b''
+            if 0 < len(last) < _HIL_FRAME_SIZE and not _is_minimal_frame(last):
+                # Timed out part way through a frame: drop the unread tail
+                # so the next command's response starts on a frame boundary
+                self.hil_serial.reset_input_buffer()
+            responses.extend(b'' for _ in range(count - len(responses)))
+            
+            # Debug log the response bytes
+            if self.debug and any(responses):
+                resp_bytes = _format_hex(b''.join(responses))
+                self._log(f"HIL RX (batch of {count}): {resp_bytes}")
+            
+            return responses
+        finally:
+            # Restore original timeout
+            set_timeout(self.hil_serial, original_timeout)
+    
+    def _read_hil_frame(self, deadline=None):
+        """
+        Read one response frame from the HIL port (short or empty on timeout)
+        
+        OK/NOT OK replies may be the 4-byte minimal frame, so that much is
+        read first and the rest of a full 8-byte frame only when needed.
+        0x55 is a legal value/checksum byte, so the end marker alone cannot
+        be used as a delimiter. With a deadline, each read only waits for
+        the time left until it; otherwise the port timeout applies.
+        """
+        ser = self.hil_serial
+        if deadline is not None:
+            set_timeout(ser, max(0.0, deadline - time.monotonic()))
+        response = ser.read(_HIL_MINIMAL_SIZE)
+        if len(response) == _HIL_MINIMAL_SIZE and not _is_minimal_frame(response):
+            if deadline is not None:
+                set_timeout(ser, max(0.0, deadline - time.monotonic()))
+            response += ser.read(_HIL_FRAME_SIZE - _HIL_MINIMAL_SIZE)
+        return response
+    
+    def _start_hil_reader(self):
+        """Start the background thread that drains the HIL port"""
+        self._hil_rx_stop = threading.Event()
+        self._hil_rx_queue = queue.Queue()
+        self._hil_rx_thread = threading.Thread(
+            target=self._hil_rx_loop,
+            args=(self.hil_serial, self._hil_rx_stop, self._hil_rx_queue),
+            name=f"hil-rx-{self.hil_port}",
+            daemon=True
+        )
+        self._hil_rx_thread.start()
+    
+    def _stop_hil_reader(self):
+        """Stop the background HIL reader thread, if running"""
+        if self._hil_rx_thread is None:
+            return
+        self._hil_rx_stop.set()
+        # Wake the thread if it is blocked in read()
+        if hasattr(self.hil_serial, 'cancel_read'):
+            self.hil_serial.cancel_read()
+        self._hil_rx_thread.join(timeout=1.0)
+        self._hil_rx_thread = None
+        self._hil_rx_stop = None
+        self._hil_rx_queue = None
+    
+    @staticmethod
+    def _hil_rx_loop(ser, stop, frames):
+        """Read the HIL port until stopped, queueing every complete frame"""
+        buf = bytearray()
+        while not stop.is_set():
+            try:
+                chunk = ser.read(ser.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError):
+                # Port closed or unplugged underneath us
+                break
+            if not chunk:
+                continue
+            buf += chunk
+            
+            # Resynchronise on the start marker and emit complete frames
+            while True:
+                start = buf.find(_HIL_START_MARKER)
+                if start < 0:
+                    buf.clear()
+                    break
+                if start:
+                    del buf[:start]
+                # A minimal OK/NOT OK frame ends at byte 4. A full frame has
+                # its signal type there, which is never the end marker.
+                if _is_minimal_frame(buf[:_HIL_MINIMAL_SIZE]):
+                    frames.put(bytes(buf[:_HIL_MINIMAL_SIZE]))
+                    del buf[:_HIL_MINIMAL_SIZE]
+                    continue
+                if len(buf) < _HIL_FRAME_SIZE:
+                    break
+                if buf[_HIL_FRAME_SIZE - 1] == _HIL_END_MARKER:
+                    frames.put(bytes(buf[:_HIL_FRAME_SIZE]))
+                    del buf[:_HIL_FRAME_SIZE]
+                else:
+                    # Not a frame boundary; look for the next start marker
+                    del buf[:1]
+    
+    def _drain_hil_queue(self):
+        """Discard frames the background reader has already queued"""
+        while True:
+            try:
+                self._hil_rx_queue.get_nowait()
+            except queue.Empty:
+                return
+    
+    def _hil_deadline(self, timeout):
+        """Absolute deadline for a read, defaulting to the port timeout"""
+        if timeout is None:
+            timeout = self.hil_timeout
+        return time.monotonic() + float(timeout)
+    
+    def _get_hil_frame(self, deadline):
+        """Take the next frame from the background reader (b'' on timeout)"""
+        try:
+            return self._hil_rx_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            return b''
+    
+    def list_available_ports(self, force=False):
+        """
+        List all available serial ports
+        
+        Args:
+            force: Rescan even if the ports were enumerated less than 2 s
+                ago (default: False)
+            
+        Returns:
+            List of port device names
+        """
+        ports = scan_ports(force)
+        
+        # Emit the listing as one message rather than one write per port
+        if self.debug:
+            lines = [f"Found {len(ports)} serial ports:"]
+            lines.extend(f"{i+1}. {port.device}: {port.description}" for i, port in enumerate(ports))
+            self._log('\n'.join(lines))
         
         return [port.device for port in ports]
     
@@ -5,11 +5,17 @@ Serial Helper Library for Robot Framework
 This library provides direct control over serial ports for Robot Framework tests.
 """
 
-import sys
 import time
-import json
+import select
+import logging
 import serial
-import serial.tools.list_ports
+
+from serial_utils import configure_port, scan_ports, read_line, set_timeout, _loads, _dumps
+
+# Messages go through logging; with the NullHandler nothing is formatted or
+# written unless the application (or Robot Framework) enables a handler
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
 
 class SerialHelper:
     """Custom Serial library for use with Robot Framework"""
@@ -22,6 +28,9 @@ class SerialHelper:
         self.port = None
         self.baudrate = None
         self.timeout = None
+        
+        # Bytes received but not yet returned as a line
+        self._rx_buf = bytearray()
     
     def open_serial_port(self, port, baudrate=115200, timeout=5.0):
         """
@@ -35,13 +44,25 @@ class SerialHelper:
         Returns:
             True if connection successful, False otherwise
         """
-        print("----opening serial port")
+        log.debug("----opening serial port")
+        
+        # Keep an already open port with identical settings; reopening costs
+        # tens of milliseconds of driver initialisation on Windows
+        if (self.is_port_open() and self.port == port
+                and int(self.baudrate) == int(baudrate)
+                and float(self.timeout) == float(timeout)):
+            log.debug("Port %s already open with the requested settings", port)
+            # Start from a clean receive buffer as a fresh open would
+            self.serial.reset_input_buffer()
+            self._rx_buf.clear()
+            return True
+        
         try:
             # Close any existing connection
             self.close_serial_port()
             
             # Try to open the port
-            print(f"Attempting to open port {port} at {baudrate} baud")
+            log.debug("Attempting to open port %s at %s baud", port, baudrate)
             self.serial = serial.Serial(
                 port=port,
                 baudrate=int(baudrate),
@@ -51,24 +72,28 @@ class SerialHelper:
                 stopbits=serial.STOPBITS_ONE
             )
             
+            configure_port(self.serial, port)
+            
             self.port = port
             self.baudrate = baudrate
             self.timeout = timeout
             
-            print(f"Successfully opened port {port}")
+            log.debug("Successfully opened port %s", port)
             return True
             
         except serial.SerialException as e:
-            print(f"Error opening port {port}: {str(e)}")
-            self.list_available_ports()
+            log.warning("Error opening port %s: %s", port, e)
+            # Show what is available at the same level as the error
+            self._log_ports(scan_ports(), logging.WARNING)
             return False
     
     def close_serial_port(self):
         """Close the current serial connection if open"""
         if self.serial and self.serial.is_open:
-            print(f"Closing port {self.port}")
+            log.debug("Closing port %s", self.port)
             self.serial.close()
             self.serial = None
+            self._rx_buf.clear()
     
     def is_port_open(self):
         """Check if the port is currently open"""
@@ -79,7 +104,8 @@ class SerialHelper:
         Write data to the serial port
         
         Args:
-            data: String data to write
+            data: String data to write (a newline is appended if missing),
+                or bytes/bytearray written unchanged
             
         Returns:
             Number of bytes written
@@ -87,6 +113,12 @@ class SerialHelper:
         if not self.is_port_open():
             raise Exception("Serial port is not open")
         
+        # Pick the writer by payload type with one lookup instead of a type-check chain
+        writer = self._WRITERS.get(type(data), SerialHelper._write_text)
+        return writer(self, data)
+    
+    def _write_text(self, data):
+        """Write a text line, encoded as UTF-8"""
         # Ensure we have a newline at the end
         if not data.endswith('\n'):
             data += '\n'
@@ -94,30 +126,77 @@ class SerialHelper:
         bytes_written = self.serial.write(data.encode('utf-8'))
         return bytes_written
     
-    def read_until_newline(self, timeout=None):
+    def _write_binary(self, data):
+        """Write binary data (e.g. a HIL frame) without any encoding"""
+        return self.serial.write(data)
+    
+    # Writers by payload type, used by write_data
+    _WRITERS = {
+        bytes: _write_binary,
+        bytearray: _write_binary,
+        memoryview: _write_binary,
+    }
+    
+    def wait_for_data(self, timeout=None):
         """
-        Read data until a newline character is found
+        Wait until received data is available to read
+        
+        Returns as soon as the first byte arrives instead of sleeping for a
+        fixed time. On POSIX the port is waited on with select(); Windows
+        serial handles can't be selected, so there the input queue is polled
+        every millisecond.
         
         Args:
-            timeout: Read timeout in seconds (default: use port timeout)
+            timeout: Maximum wait in seconds (default: use port timeout)
             
         Returns:
-            String data read
+            True if data is available, False if the timeout expired
         """
         if not self.is_port_open():
             raise Exception("Serial port is not open")
         
-        # Use the specified timeout or the port default
-        original_timeout = self.serial.timeout
+        if self._rx_buf or self.serial.in_waiting:
+            return True
+        
+        timeout = self.timeout if timeout is None else timeout
+        timeout = None if timeout is None else float(timeout)
+        
         try:
-            if timeout is not None:
-                self.serial.timeout = float(timeout)
+            fd = self.serial.fileno()
+        except (AttributeError, OSError):
+            fd = None
+        
+        if fd is not None:
+            readable, _, _ = select.select([fd], [], [], timeout)
+            return bool(readable)
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.serial.in_waiting:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+    
+    def read_until_newline(self, timeout=None, raw=False):
+        """
+        Read data until a newline character is found
+        
+        Args:
+            timeout: Read timeout in seconds (default: use port timeout)
+            raw: Return the undecoded bytes instead of a string (default: False)
             
-            data = self.serial.readline().decode('utf-8')
-            return data
-        finally:
-            # Restore original timeout
-            self.serial.timeout = original_timeout
+        Returns:
+            String data read, or bytes if raw is True
+        """
+        if not self.is_port_open():
+            raise Exception("Serial port is not open")
+        
+        # Use the specified timeout or the one the port was opened with. The
+        # port keeps whatever was set last, so it is not restored afterwards.
+        set_timeout(self.serial, self.timeout if timeout is None else timeout)
+        
+        data = read_line(self.serial, self._rx_buf)
+        return data if raw else data.decode('utf-8')
     
     def send_command_and_get_response(self, command_json, timeout=5.0):
         """
@@ -133,31 +212,83 @@ class SerialHelper:
         if not self.is_port_open():
             raise Exception("Serial port is not open")
         
-        # Convert dict to string if needed
-        if isinstance(command_json, dict):
-            command_str = json.dumps(command_json)
-        else:
-            command_str = command_json
-        
         # Send the command
-        self.write_data(command_str)
+        self.write_data(self._encode_command(command_json))
+        
+        # Get the response; the parser accepts the raw bytes directly
+        return self._parse_response(self.read_until_newline(timeout, raw=True))
+    
+    def send_commands_and_get_responses(self, commands, timeout=5.0):
+        """
+        Send several JSON commands in one write and read all responses back
+        
+        The device answers one line per command in the order the commands
+        were received, so the batch costs one round trip instead of one per
+        command. Each response is parsed on its own: an invalid or missing
+        response yields an error dictionary in its position and does not
+        affect the others.
+        
+        Args:
+            commands: List of JSON command strings or dictionaries
+            timeout: Read timeout in seconds for each response
+            
+        Returns:
+            List with one dictionary per command, in command order
+        """
+        if not self.is_port_open():
+            raise Exception("Serial port is not open")
+        
+        # Send all commands at once
+        self.write_data(b''.join(self._encode_command(command) for command in commands))
         
-        # Get the response
-        response_str = self.read_until_newline(timeout)
+        return [self._parse_response(self.read_until_newline(timeout, raw=True))
+                for _ in range(len(commands))]
+    
+    @staticmethod
+    def _encode_command(command_json):
+        """Encode a JSON command string or dictionary as a newline-terminated line"""
+        # Dicts are encoded straight to the wire bytes
+        if isinstance(command_json, dict):
+            return _dumps(command_json) + b'\n'
         
-        # Parse and return JSON
+        # Bytes are taken as already encoded, as in write_data
+        if isinstance(command_json, (bytes, bytearray, memoryview)):
+            return command_json
+        
+        # Ensure we have a newline at the end
+        if not command_json.endswith('\n'):
+            command_json += '\n'
+        return command_json.encode('utf-8')
+    
+    def _parse_response(self, response_bytes):
+        """Parse one response line into a dictionary"""
         try:
-            return json.loads(response_str)
-        except json.JSONDecodeError:
-            print(f"Invalid JSON response: {response_str}")
+            return _loads(response_bytes)
+        except ValueError:
+            # JSONDecodeError, or UnicodeDecodeError for non UTF-8 data
+            response_str = response_bytes.decode('utf-8', errors='replace')
+            log.warning("Invalid JSON response: %s", response_str)
             return {"error": "Invalid JSON response", "raw_data": response_str}
     
-    def list_available_ports(self):
-        """List all available serial ports"""
-        ports = list(serial.tools.list_ports.comports())
-        
-        print(f"Found {len(ports)} serial ports:")
-        for i, port in enumerate(ports):
-            print(f"{i+1}. {port.device}: {port.description}")
+    def list_available_ports(self, force=False):
+        """
+        List all available serial ports
         
-        return [port.device for port in ports]
\ No newline at end of file
+        Args:
+            force: Rescan even if the ports were enumerated less than 2 s
+                ago (default: False)
+            
+        Returns:
+            List of port device names
+        """
+        ports = scan_ports(force)
+        self._log_ports(ports, logging.DEBUG)
+        return [port.device for port in ports]
+    
+    @staticmethod
+    def _log_ports(ports, level):
+        """Log a port listing as one message, built only if it will be logged"""
+        if log.isEnabledFor(level):
+            lines = [f"Found {len(ports)} serial ports:"]
+            lines.extend(f"{i+1}. {port.device}: {port.description}" for i, port in enumerate(ports))
+            log.log(level, '\n'.join(lines))
\ No newline at end of file
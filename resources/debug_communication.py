@@ -33,6 +33,15 @@ def print_header(title):
     print(f"  {title}")
     print("=" * 60)
 
+# Wire form of the ping command; only the timestamp varies, so it is
+# substituted into the JSON text instead of serializing a fresh dict
+_PING_TMPL = ('{{"type":"cmd","id":"debug-ping-001","topic":"system",'
+              '"action":"ping","data":{{"timestamp":"{timestamp}"}}}}\n')
+
+def ping_command():
+    """Build the JSON line for a ping stamped with the current time"""
+    return _PING_TMPL.format(timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ"))
+
 def test_illuminator(serial_helper, port, baudrate=115200, timeout=5.0):
     """Test communication with the Illuminator device"""
     print_header("Testing Illuminator Communication")
@@ -47,17 +56,8 @@ def test_illuminator(serial_helper, port, baudrate=115200, timeout=5.0):
     
     # Try a ping command
     print("\nSending ping command...")
-    timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ")
-    command = {
-        "type": "cmd",
-        "id": "debug-ping-001",
-        "topic": "system",
-        "action": "ping",
-        "data": {"timestamp": timestamp}
-    }
-    
     try:
-        response = serial_helper.send_illuminator_command(command)
+        response = serial_helper.send_illuminator_command(ping_command())
         print(f"Response received: {json.dumps(response, indent=2)}")
         
         # Check if response has data and status
@@ -112,8 +112,106 @@ def test_hil(serial_helper, hil_protocol, port, baudrate=115200, timeout=5.0):
         # We'll keep the connection open for now
         pass
 
-def test_light_control(serial_helper, hil_protocol):
-    """Test light control and PWM feedback"""
+# Upper bound on how long the PWM output may take to follow an intensity change
+PWM_SETTLE_TIMEOUT = 0.5
+
+# Pause between PWM polls while waiting for the outputs to settle
+PWM_POLL_INTERVAL = 0.02
+
+LIGHT_IDS = (1, 2, 3)
+TEST_INTENSITIES = [0, 25, 50, 75, 100]
+
+# Wire forms of the light commands; only the ids and intensities vary, so
+# they are substituted into the JSON text instead of serializing a fresh
+# dict every time
+_SET_TMPL = ('{{"type":"cmd","id":"{cmd_id}","topic":"light",'
+             '"action":"set","data":{{"id":{light_id},"intensity":{intensity}}}}}\n')
+_SET_ALL_TMPL = ('{{"type":"cmd","id":"{cmd_id}","topic":"light",'
+                 '"action":"set_all","data":{{"intensities":[{intensities}]}}}}\n')
+
+def set_command(cmd_id, light_id, intensity):
+    """Build the JSON line for a set command"""
+    return _SET_TMPL.format(cmd_id=cmd_id, light_id=light_id, intensity=intensity)
+
+def set_all_command(cmd_id, intensities):
+    """Build the JSON line for a set_all command"""
+    return _SET_ALL_TMPL.format(cmd_id=cmd_id, intensities=','.join(map(str, intensities)))
+
+def pwm_matches(duty_cycle, intensity):
+    """Check a measured duty cycle against the requested intensity"""
+    if duty_cycle is None:
+        return False
+    return ((intensity == 0 and duty_cycle < 5) or
+            (intensity == 100 and duty_cycle > 95) or
+            abs(duty_cycle - intensity) <= 5)
+
+def wait_for_pwm(hil_protocol, light_id, intensity, timeout=PWM_SETTLE_TIMEOUT):
+    """
+    Poll the PWM duty cycle until it matches the intensity or the timeout expires
+    
+    Polls are spaced by a short pause. Returns the last measured duty cycle,
+    so a settled output is reported as soon as it is seen instead of after a
+    fixed delay.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        duty_cycle = hil_protocol.get_pwm_duty_cycle(light_id)
+        if pwm_matches(duty_cycle, intensity) or time.monotonic() >= deadline:
+            return duty_cycle
+        time.sleep(PWM_POLL_INTERVAL)
+
+def wait_for_all_pwm(hil_protocol, light_ids, intensities, timeout=PWM_SETTLE_TIMEOUT):
+    """
+    Poll the PWM duty cycles of several lights until they all match their
+    intensities or the timeout expires
+    
+    Each poll reads every light in one batched HIL round trip
+    (read_all_pwm_duty_cycles) instead of one round trip per light. Returns
+    the last measured duty cycles, in light ID order.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        duty_cycles = hil_protocol.read_all_pwm_duty_cycles(light_ids)
+        settled = all(pwm_matches(duty_cycle, intensity)
+                      for duty_cycle, intensity in zip(duty_cycles, intensities))
+        if settled or time.monotonic() >= deadline:
+            return duty_cycles
+        time.sleep(PWM_POLL_INTERVAL)
+
+def report_pwm(duty_cycle, intensity):
+    """Print how a measured duty cycle compares to the requested intensity"""
+    print(f"Measured PWM duty cycle: {duty_cycle}%")
+    
+    # Verify duty cycle is close to what we expect
+    if duty_cycle is None:
+        print("✗ No PWM reading")
+    elif not pwm_matches(duty_cycle, intensity):
+        print(f"✗ Duty cycle ({duty_cycle}%) differs from expected ({intensity}%)")
+    elif intensity == 0:
+        print("✓ Light is OFF as expected")
+    elif intensity == 100:
+        print("✓ Light is FULL ON as expected")
+    else:
+        print(f"✓ Duty cycle ({duty_cycle}%) is close to expected ({intensity}%)")
+
+def wait_off(wait, *args):
+    """Run a PWM wait for lights turned off, reporting (not raising) read errors"""
+    try:
+        wait(*args)
+    except Exception as e:
+        print(f"Error reading PWM: {e}")
+
+def test_light_control(serial_helper, hil_protocol, wait_ready=wait_for_pwm,
+                       wait_all_ready=wait_for_all_pwm):
+    """
+    Test light control and PWM feedback
+    
+    wait_ready(hil_protocol, light_id, intensity) is called after each set
+    command and returns the measured duty cycle. After the initial all-off,
+    wait_all_ready(hil_protocol, light_ids, intensities) checks every light
+    with batched HIL reads. Pass functions with a longer settle time for
+    outputs that ramp slowly.
+    """
     print_header("Testing Light Control and PWM Feedback")
     
     # Check if both devices are connected
@@ -129,37 +227,36 @@ def test_light_control(serial_helper, hil_protocol):
     
     # First turn off all lights
     print("\nTurning off all lights...")
-    command = {
-        "type": "cmd",
-        "id": "debug-all-off",
-        "topic": "light",
-        "action": "set_all",
-        "data": {"intensities": [0, 0, 0]}
-    }
+    command = set_all_command("debug-all-off", [0] * len(LIGHT_IDS))
     
     response = serial_helper.send_illuminator_command(command)
     print(f"Response: {json.dumps(response, indent=2)}")
     
-    # Wait for system to stabilize
-    time.sleep(1)
+    # Wait for system to stabilize, polling all lights in one round trip
+    wait_off(wait_all_ready, hil_protocol, LIGHT_IDS, [0] * len(LIGHT_IDS))
     
     # Test each light individually
-    for light_id in range(1, 4):
+    for light_id in LIGHT_IDS:
         print(f"\nTesting Light {light_id}...")
-        test_intensities = [0, 25, 50, 75, 100]
         
-        for intensity in test_intensities:
+        for intensity in TEST_INTENSITIES:
             # Set light intensity
-            command = {
-                "type": "cmd",
-                "id": f"debug-set-{light_id}",
-                "topic": "light",
-                "action": "set",
-                "data": {"id": light_id, "intensity": intensity}
-            }
+            command = set_command(f"debug-set-{light_id}", light_id, intensity)
             
             print(f"Setting Light {light_id} to {intensity}%...")
-            response = serial_helper.send_illuminator_command(command)
+            serial_helper.write_illuminator_command(command)
+            
+            # Poll the PWM output while the Illuminator is still processing
+            # the set; its reply waits in the driver buffer and is read
+            # afterwards
+            pwm_error = None
+            try:
+                duty_cycle = wait_ready(hil_protocol, light_id, intensity)
+            except Exception as e:
+                duty_cycle = None
+                pwm_error = e
+            
+            response = serial_helper.read_illuminator_response()
             
             if response and "data" in response and "status" in response["data"]:
                 if response["data"]["status"] == "ok":
@@ -171,37 +268,17 @@ def test_light_control(serial_helper, hil_protocol):
                 print(f"Invalid response: {response}")
                 continue
             
-            # Allow system to stabilize
-            time.sleep(0.5)
+            if pwm_error is not None:
+                print(f"Error reading PWM: {pwm_error}")
+                continue
             
-            # Read PWM duty cycle
-            try:
-                duty_cycle = hil_protocol.get_pwm_duty_cycle(light_id)
-                print(f"Measured PWM duty cycle: {duty_cycle}%")
-                
-                # Verify duty cycle is close to what we expect
-                if intensity == 0 and duty_cycle < 5:
-                    print("✓ Light is OFF as expected")
-                elif intensity == 100 and duty_cycle > 95:
-                    print("✓ Light is FULL ON as expected")
-                elif abs(duty_cycle - intensity) <= 5:
-                    print(f"✓ Duty cycle ({duty_cycle}%) is close to expected ({intensity}%)")
-                else:
-                    print(f"✗ Duty cycle ({duty_cycle}%) differs from expected ({intensity}%)")
-            except Exception as e:
-                print(f"Error reading PWM: {e}")
+            report_pwm(duty_cycle, intensity)
         
         # Turn off the light before testing the next one
-        command = {
-            "type": "cmd",
-            "id": f"debug-off-{light_id}",
-            "topic": "light",
-            "action": "set",
-            "data": {"id": light_id, "intensity": 0}
-        }
+        command = set_command(f"debug-off-{light_id}", light_id, 0)
         
         serial_helper.send_illuminator_command(command)
-        time.sleep(0.5)
+        wait_off(wait_ready, hil_protocol, light_id, 0)
     
     return True
 
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Shared serial helpers for the Robot Framework serial libraries
+
+Used by SerialHelper, ImprovedSerialHelper, AsyncSerialHelper and
+ImprovedHILProtocol; not a Robot library itself.
+"""
+
+import os
+import sys
+import json
+import time
+
+# orjson is optional; when installed it is used for all JSON commands.
+# Both parsers raise json.JSONDecodeError (orjson's error subclasses it).
+# _dumps returns compact UTF-8 bytes either way, ready to be written.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+else:
+    _loads = json.loads
+    _json_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    def _dumps(obj):
+        return _json_encode(obj).encode('utf-8')
+
+# How long a serial port scan is reused, so connections failing one after
+# another (e.g. both devices during setup) only enumerate the ports once
+_PORTS_CACHE_TTL = 2.0
+
+# Last serial port scan and when it was taken, shared by all library
+# instances (see scan_ports)
+_ports_cache = (0.0, None)
+
+def _format_hex(data):
+    """Render bytes as "0xAA 0x53 ..." using one C-level hex pass"""
+    if not data:
+        return ''
+    return '0x' + bytes(data).hex(' ').upper().replace(' ', ' 0x')
+
+def scan_ports(force=False):
+    """
+    Enumerate the serial ports, reusing a scan from the last 2 s
+    
+    Args:
+        force: Rescan even if a recent scan is available (default: False)
+        
+    Returns:
+        Tuple of serial.tools.list_ports ListPortInfo objects
+    """
+    global _ports_cache
+    scanned_at, ports = _ports_cache
+    now = time.monotonic()
+    if force or ports is None or now - scanned_at >= _PORTS_CACHE_TTL:
+        # Imported here so the helpers that never scan don't need pyserial
+        import serial.tools.list_ports
+        ports = tuple(serial.tools.list_ports.comports())
+        _ports_cache = (now, ports)
+    return ports
+
+def configure_port(ser, port):
+    """
+    Tune a freshly opened port for short request/response exchanges
+    
+    On Windows the driver receive buffer is enlarged, since the default
+    4 KB can overrun between reads. Elsewhere the USB-serial poll interval
+    (16 ms on FTDI) is dropped to 1 ms. Not all drivers support this, so
+    failures are ignored.
+    
+    Args:
+        ser: Open serial.Serial instance
+        port: Port name the instance was opened with
+    """
+    if sys.platform.startswith('win') and hasattr(ser, 'set_buffer_size'):
+        ser.set_buffer_size(rx_size=65536, tx_size=16384)
+    elif hasattr(ser, 'set_low_latency_mode'):
+        try:
+            ser.set_low_latency_mode(True)
+        except (OSError, ValueError):
+            pass
+        if sys.platform.startswith('linux'):
+            _set_ftdi_latency_timer(port)
+
+def set_timeout(ser, timeout):
+    """
+    Set a port's read timeout, skipping the driver call if it is unchanged
+    
+    Every assignment reprograms the port (termios / SetCommTimeouts), so
+    consecutive reads with the same timeout should not touch it.
+    """
+    timeout = None if timeout is None else float(timeout)
+    if ser.timeout != timeout:
+        ser.timeout = timeout
+
+def read_line(ser, buf):
+    """
+    Read one newline-terminated line from a port
+    
+    Each read takes everything the driver has already buffered, so a line
+    costs one or two reads rather than one per byte as with readline().
+    Bytes after the newline are kept in buf for the next call. Returns what
+    arrived (possibly an incomplete line) if the port timeout expires first.
+    
+    Args:
+        ser: Open serial.Serial instance
+        buf: bytearray holding the bytes received but not yet returned
+    """
+    deadline = None if ser.timeout is None else time.monotonic() + ser.timeout
+    expired = False
+    
+    while True:
+        end = buf.find(b'\n')
+        if end >= 0:
+            line = bytes(buf[:end + 1])
+            del buf[:end + 1]
+            return line
+        
+        chunk = b'' if expired else ser.read(ser.in_waiting or 1)
+        if not chunk:
+            # Timed out: hand back the partial line, as readline() would
+            line = bytes(buf)
+            buf.clear()
+            return line
+        buf += chunk
+        expired = deadline is not None and time.monotonic() >= deadline
+
+def _set_ftdi_latency_timer(port):
+    """
+    Set the FTDI latency timer of a Linux USB-serial port to 1 ms
+    
+    The ftdi_sio driver exposes the timer in sysfs; other adapters don't
+    have the file and writing it needs permissions, so this is best effort.
+    """
+    path = f"/sys/bus/usb-serial/devices/{os.path.basename(os.path.realpath(port))}/latency_timer"
+    try:
+        with open(path, 'w') as f:
+            f.write('1')
+    except OSError:
+        pass
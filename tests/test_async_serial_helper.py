@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for AsyncSerialHelper's blocking keywords over a fake serial stream
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'resources'))
+
+import AsyncSerialHelper as async_serial_helper
+from AsyncSerialHelper import AsyncSerialHelper
+
+PONG = b'{"type":"resp","id":"ping-1","data":{"status":"ok"}}\n'
+PWM_FRAME = bytes([0xAA, 0x47, 0x31, 0x50, 0x32, 0x00, 0x14, 0x55])
+
+class _FakeSerial:
+    """Stands in for the pyserial port behind the transport"""
+    
+    def __init__(self):
+        self.resets = 0
+    
+    def reset_input_buffer(self):
+        self.resets += 1
+
+class _FakeTransport:
+    def __init__(self):
+        self.serial = _FakeSerial()
+
+class _FakeWriter:
+    """StreamWriter stand-in that answers each write with the next scripted reply"""
+    
+    def __init__(self, reader, replies):
+        self._reader = reader
+        self._replies = list(replies)
+        self._closed = False
+        self.transport = _FakeTransport()
+        self.written = []
+    
+    def write(self, data):
+        self.written.append(bytes(data))
+        if self._replies:
+            self._reader.feed_data(self._replies.pop(0))
+    
+    async def drain(self):
+        pass
+    
+    def close(self):
+        self._closed = True
+    
+    def is_closing(self):
+        return self._closed
+    
+    async def wait_closed(self):
+        pass
+
+class _FakeSerialAsyncio:
+    """Replaces the serial_asyncio module; opens a fake reader/writer pair"""
+    
+    def __init__(self, replies):
+        self._replies = replies
+        self.writer = None
+    
+    async def open_serial_connection(self, url, baudrate):
+        reader = asyncio.StreamReader()
+        self.writer = _FakeWriter(reader, self._replies)
+        return reader, self.writer
+
+class AsyncSerialHelperTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved_module = async_serial_helper.serial_asyncio
+        self.helper = AsyncSerialHelper()
+        self.helper.debug = False
+    
+    def tearDown(self):
+        self.helper.close_serial_port()
+        async_serial_helper.serial_asyncio = self._saved_module
+    
+    def _open(self, replies):
+        fake = _FakeSerialAsyncio(replies)
+        async_serial_helper.serial_asyncio = fake
+        self.assertTrue(self.helper.open_serial_port('COM_TEST'))
+        return fake
+    
+    def test_response_in_time(self):
+        fake = self._open([PONG])
+        response = self.helper.send_command_and_get_response({"type": "cmd", "id": "ping-1"}, timeout=1.0)
+        self.assertEqual(response["data"]["status"], "ok")
+        self.assertEqual(fake.writer.written, [b'{"type":"cmd","id":"ping-1"}\n'])
+    
+    def test_timeout_discards_partial_line(self):
+        fake = self._open([b'{"type":"resp",', PONG])
+        response = self.helper.send_command_and_get_response('{"id":"ping-0"}', timeout=0.05)
+        self.assertEqual(response, {"error": "Invalid JSON response", "raw_data": ""})
+        self.assertEqual(fake.writer.transport.serial.resets, 1)
+        
+        # The partial line was dropped, so the next reply parses cleanly
+        response = self.helper.send_command_and_get_response('{"id":"ping-1"}', timeout=1.0)
+        self.assertEqual(response["id"], "ping-1")
+    
+    def test_binary_timeout_keeps_frames_aligned(self):
+        self._open([PWM_FRAME[:5], PWM_FRAME])
+        self.assertEqual(self.helper.send_binary_and_get_response(bytes(8), timeout=0.05), b'')
+        self.assertEqual(self.helper.send_binary_and_get_response(bytes(8), timeout=1.0), PWM_FRAME)
+    
+    def test_close_stops_loop_thread(self):
+        fake = self._open([])
+        thread = self.helper._loop_thread
+        self.assertTrue(thread.is_alive())
+        
+        self.helper.close_serial_port()
+        
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(fake.writer.is_closing())
+        self.assertFalse(self.helper.is_port_open())
+        self.assertIsNone(self.helper._loop)
+        
+        # Closing again is a no-op
+        self.helper.close_serial_port()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for reading batched HIL replies without the background reader
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import time
+import unittest
+
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'resources'))
+
+from ImprovedSerialHelper import ImprovedSerialHelper
+
+# Full PWM replies for lights 1 and 3 (value 50) and a minimal NOT OK reply
+PWM_FRAME_1 = bytes([0xAA, 0x47, 0x31, 0x50, 0x32, 0x00, 0x14, 0x55])
+PWM_FRAME_3 = bytes([0xAA, 0x47, 0x33, 0x50, 0x32, 0x00, 0x16, 0x55])
+NOT_OK_FRAME = bytes([0xAA, 0x4E, 0x32, 0x55])
+
+class _ReplyPort:
+    """Serial stand-in that serves the given reply bytes, then times out"""
+    
+    def __init__(self, data):
+        self._data = bytearray(data)
+        self.timeout = 1.0
+        self.written = b''
+        self.reset = False
+    
+    def write(self, data):
+        self.written += bytes(data)
+        return len(data)
+    
+    def read(self, size=1):
+        chunk = bytes(self._data[:size])
+        del self._data[:size]
+        return chunk
+    
+    def reset_input_buffer(self):
+        self.reset = True
+        self._data.clear()
+
+class _SlowPort(_ReplyPort):
+    """Reply port whose first frame takes a while and then stalls"""
+    
+    def read(self, size=1):
+        if not self._data:
+            # Stalled: block for the whole read timeout, as pyserial does
+            time.sleep(self.timeout)
+            return b''
+        time.sleep(0.1)
+        return super().read(size)
+
+def _helper(data):
+    helper = ImprovedSerialHelper()
+    helper.debug = False
+    helper.hil_serial = _ReplyPort(data)
+    helper.hil_timeout = 1.0
+    helper._hil_open = True
+    return helper
+
+class HilBatchTest(unittest.TestCase):
+    
+    def test_minimal_reply_keeps_later_frames_aligned(self):
+        helper = _helper(PWM_FRAME_1 + NOT_OK_FRAME + PWM_FRAME_3)
+        commands = [bytes(8)] * 3
+        self.assertEqual(helper.send_hil_commands_batch(commands),
+                         [PWM_FRAME_1, NOT_OK_FRAME, PWM_FRAME_3])
+        self.assertEqual(helper.hil_serial.written, bytes(24))
+    
+    def test_missing_replies_are_empty(self):
+        helper = _helper(PWM_FRAME_1 + PWM_FRAME_3[:5])
+        self.assertEqual(helper.send_hil_commands_batch([bytes(8)] * 3),
+                         [PWM_FRAME_1, PWM_FRAME_3[:5], b''])
+        self.assertTrue(helper.hil_serial.reset)
+    
+    def test_batch_timeout_bounds_the_whole_batch(self):
+        helper = _helper(b'')
+        helper.hil_serial = _SlowPort(PWM_FRAME_1)
+        start = time.monotonic()
+        responses = helper.send_hil_commands_batch([bytes(8)] * 2, timeout=0.3)
+        elapsed = time.monotonic() - start
+        self.assertEqual(responses, [PWM_FRAME_1, b''])
+        self.assertLess(elapsed, 0.4)
+        # The port timeout is put back afterwards
+        self.assertEqual(helper.hil_serial.timeout, 1.0)
+    
+    def test_lost_port_marks_hil_disconnected(self):
+        helper = _helper(b'')
+        def read(size=1):
+            raise serial.SerialException("device disconnected")
+        helper.hil_serial.read = read
+        with self.assertRaises(serial.SerialException):
+            helper.send_hil_commands_batch([bytes(8)])
+        self.assertFalse(helper.is_hil_connected())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the background HIL reader's frame extraction
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import queue
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'resources'))
+
+from ImprovedSerialHelper import ImprovedSerialHelper
+
+# Full PWM reply for light 1 (value 85) and minimal OK / NOT OK replies
+PWM_FRAME = bytes([0xAA, 0x47, 0x31, 0x50, 0x55, 0x00, 0x73, 0x55])
+OK_FRAME = bytes([0xAA, 0x4F, 0x31, 0x55])
+NOT_OK_FRAME = bytes([0xAA, 0x4E, 0x32, 0x55])
+
+class _ChunkedPort:
+    """Serial stand-in returning the given chunks, then stopping the reader"""
+    
+    def __init__(self, chunks, stop):
+        self._chunks = list(chunks)
+        self._stop = stop
+    
+    @property
+    def in_waiting(self):
+        return len(self._chunks[0]) if self._chunks else 0
+    
+    def read(self, size=1):
+        if not self._chunks:
+            self._stop.set()
+            return b''
+        return self._chunks.pop(0)
+
+def _run_rx_loop(chunks):
+    """Feed chunks through _hil_rx_loop and return the queued frames"""
+    stop = threading.Event()
+    frames = queue.Queue()
+    ImprovedSerialHelper._hil_rx_loop(_ChunkedPort(chunks, stop), stop, frames)
+    return [frames.get_nowait() for _ in range(frames.qsize())]
+
+class HilRxLoopTest(unittest.TestCase):
+    
+    def test_full_and_minimal_frames_in_one_chunk(self):
+        data = OK_FRAME + PWM_FRAME + NOT_OK_FRAME + PWM_FRAME
+        self.assertEqual(_run_rx_loop([data]),
+                         [OK_FRAME, PWM_FRAME, NOT_OK_FRAME, PWM_FRAME])
+    
+    def test_frames_split_across_reads(self):
+        data = PWM_FRAME + OK_FRAME + PWM_FRAME
+        chunks = [data[i:i + 1] for i in range(len(data))]
+        self.assertEqual(_run_rx_loop(chunks), [PWM_FRAME, OK_FRAME, PWM_FRAME])
+    
+    def test_resynchronises_after_garbage(self):
+        data = b'\x00\x13' + OK_FRAME + b'\xAA\x01' + PWM_FRAME
+        self.assertEqual(_run_rx_loop([data]), [OK_FRAME, PWM_FRAME])
+
+if __name__ == '__main__':
+    unittest.main()